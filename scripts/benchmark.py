@@ -0,0 +1,433 @@
+#!/usr/bin/env python
+"""
+Measure how quickly WhiteNoise serves requests, in-process, through both the
+WSGI application and the Django middleware.
+
+Each scenario is run for a number of requests, recording the time taken by
+each one (including reading the whole response body), from which requests per
+second and latency percentiles are calculated. A second, shorter pass under
+tracemalloc records the peak memory allocated while handling a request, and
+the number of memory blocks still allocated afterwards.
+
+Results are written as JSON, and a previous results file can be passed to
+--compare to print the change in each figure:
+
+    python scripts/benchmark.py --output before.json
+    # ... make changes ...
+    python scripts/benchmark.py --output after.json --compare before.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from statistics import median
+
+module_dir = Path(__file__).parent.resolve()
+sys.path.insert(0, str(module_dir / "../src"))
+
+from whitenoise import WhiteNoise  # noqa: E402
+from whitenoise.compress import Compressor  # noqa: E402
+
+FORMAT_VERSION = 1
+
+STATIC_PREFIX = "/static/"
+
+SMALL_CONTENT = b"function f(x) { return x * 2; }\n" * 32
+LARGE_SIZE = 4 * 1024 * 1024
+
+# Accept-Encoding headers cycled through by the "mixed-encoding" scenario,
+# roughly in proportion to how often browsers and other clients send them
+MIXED_ACCEPT_ENCODINGS = [
+    "gzip, deflate, br, zstd",
+    "gzip, deflate, br",
+    "gzip, deflate, br",
+    "gzip",
+    "",
+]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark WhiteNoise's request handling"
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=20000,
+        help="Number of timed requests per scenario (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Run each scenario this many times and keep the fastest "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--targets",
+        default="wsgi,django",
+        help="Comma-separated targets to run (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--scenarios",
+        help="Comma-separated scenarios to run (default: all)",
+    )
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument(
+        "--compare", help="Compare results with those in this JSON file"
+    )
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS
+    if args.scenarios:
+        names = args.scenarios.split(",")
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        scenarios = {name: SCENARIOS[name] for name in names}
+    targets = args.targets.split(",")
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"Unknown targets: {', '.join(sorted(unknown))}")
+
+    root = tempfile.mkdtemp()
+    try:
+        create_files(root)
+        results = {}
+        for target in targets:
+            application = TARGETS[target](root)
+            if application is None:
+                print(f"Skipping {target}: not available")
+                continue
+            results[target] = {}
+            for name, scenario in scenarios.items():
+                environs = scenario(root)
+                result = run_scenario(application, environs, args.requests, args.repeat)
+                results[target][name] = result
+                print(format_result(target, name, result))
+    finally:
+        shutil.rmtree(root)
+
+    data = {
+        "version": FORMAT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": get_commit(),
+        "python": platform.python_implementation() + " " + platform.python_version(),
+        "platform": platform.platform(),
+        "requests": args.requests,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("version") != FORMAT_VERSION:
+            print(f"Can't compare with {args.compare}: different format version")
+            return 1
+        print()
+        print(f"Compared with {args.compare} ({baseline.get('commit')}):")
+        for line in compare_results(baseline["results"], results):
+            print(line)
+    return 0
+
+
+def create_files(root):
+    static_root = os.path.join(root, "static")
+    os.makedirs(os.path.join(static_root, "css"))
+    with open(os.path.join(static_root, "app.js"), "wb") as f:
+        f.write(SMALL_CONTENT)
+    with open(os.path.join(static_root, "css", "site.css"), "wb") as f:
+        f.write(b"body { margin: 0; padding: 0; }\n" * 32)
+    # Incompressible data, so no compressed variants are created
+    with open(os.path.join(static_root, "video.bin"), "wb") as f:
+        f.write(os.urandom(LARGE_SIZE))
+    compressor = Compressor(quiet=True)
+    for path in ("app.js", "css/site.css"):
+        compressor.compress(os.path.join(static_root, path))
+    # Make sure gzip variants exist even where compression was judged
+    # ineffective, so encoding negotiation is always exercised
+    app_js = os.path.join(static_root, "app.js")
+    if not os.path.exists(app_js + ".gz"):
+        with open(app_js + ".gz", "wb") as f:
+            f.write(gzip.compress(SMALL_CONTENT))
+
+
+# Targets
+
+
+def fallthrough_app(environ, start_response):
+    start_response("404 Not Found", [("Content-Type", "text/plain")])
+    return [b"Not found"]
+
+
+def create_wsgi_target(root):
+    application = WhiteNoise(fallthrough_app, max_age=60)
+    application.add_files(os.path.join(root, "static"), prefix=STATIC_PREFIX)
+
+    def call(environ):
+        headers = []
+        result = application(environ, lambda status, h: headers.append(status))
+        try:
+            for _ in result:
+                pass
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return headers[0]
+
+    return call
+
+
+def create_django_target(root):
+    try:
+        import django
+        from django.conf import settings
+    except ImportError:
+        return None
+    settings.configure(
+        DEBUG=False,
+        ALLOWED_HOSTS=["*"],
+        SECRET_KEY="benchmark",
+        INSTALLED_APPS=["django.contrib.staticfiles"],
+        STATIC_URL=STATIC_PREFIX,
+        STATIC_ROOT=os.path.join(root, "static"),
+        MIDDLEWARE=[],
+        WHITENOISE_MAX_AGE=60,
+    )
+    django.setup()
+    from django.core.handlers.wsgi import WSGIRequest
+    from django.http import HttpResponse
+
+    from whitenoise.middleware import WhiteNoiseMiddleware
+
+    middleware = WhiteNoiseMiddleware(
+        lambda request: HttpResponse("Not found", status=404)
+    )
+
+    def call(environ):
+        response = middleware(WSGIRequest(dict(environ)))
+        try:
+            for _ in response:
+                pass
+        finally:
+            response.close()
+        return response.status_code
+
+    return call
+
+
+TARGETS = {
+    "wsgi": create_wsgi_target,
+    "django": create_django_target,
+}
+
+
+# Scenarios: each returns the list of environs to cycle through
+
+
+def base_environ(path, method="GET", **headers):
+    return {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(),
+        **headers,
+    }
+
+
+def small_hit(root):
+    return [base_environ(STATIC_PREFIX + "app.js")]
+
+
+def large_stream(root):
+    return [base_environ(STATIC_PREFIX + "video.bin")]
+
+
+def not_modified(root):
+    # Get the ETag the same way a browser would, from a first response
+    application = WhiteNoise(None)
+    application.add_files(os.path.join(root, "static"), prefix=STATIC_PREFIX)
+    etag = application.files[STATIC_PREFIX + "css/site.css"].etag
+    return [base_environ(STATIC_PREFIX + "css/site.css", HTTP_IF_NONE_MATCH=etag)]
+
+
+def range_request(root):
+    return [
+        base_environ(STATIC_PREFIX + "video.bin", HTTP_RANGE="bytes=1048576-1114111")
+    ]
+
+
+def miss(root):
+    return [base_environ("/app/dashboard/")]
+
+
+def mixed_encoding(root):
+    return [
+        base_environ(STATIC_PREFIX + path, HTTP_ACCEPT_ENCODING=accept_encoding)
+        for accept_encoding in MIXED_ACCEPT_ENCODINGS
+        for path in ("app.js", "css/site.css")
+    ]
+
+
+SCENARIOS = {
+    "small-hit": small_hit,
+    "large-stream": large_stream,
+    "not-modified": not_modified,
+    "range": range_request,
+    "miss": miss,
+    "mixed-encoding": mixed_encoding,
+}
+
+
+# Measurement
+
+
+def run_scenario(call, environs, request_count, repeat):
+    # Streaming large files is much slower, so scale those runs down to keep
+    # the total time reasonable
+    if environs[0]["PATH_INFO"].endswith(".bin") and "HTTP_RANGE" not in environs[0]:
+        request_count = max(request_count // 100, 10)
+    for environ in environs:
+        call(environ)
+
+    best = None
+    for _ in range(repeat):
+        timings = time_requests(call, environs, request_count)
+        if best is None or sum(timings) < sum(best):
+            best = timings
+    timings = sorted(best)
+    total = sum(timings) / 1e9
+
+    alloc_requests = min(request_count, 1000)
+    peak_bytes, retained_blocks = measure_allocations(call, environs, alloc_requests)
+    return {
+        "requests": request_count,
+        "requests_per_second": round(request_count / total, 1),
+        "latency_us": {
+            "p50": round(percentile(timings, 50) / 1000, 2),
+            "p90": round(percentile(timings, 90) / 1000, 2),
+            "p99": round(percentile(timings, 99) / 1000, 2),
+            "max": round(timings[-1] / 1000, 2),
+        },
+        "peak_alloc_bytes_per_request": round(median(peak_bytes)),
+        "retained_blocks_per_request": round(retained_blocks / alloc_requests, 3),
+    }
+
+
+def time_requests(call, environs, request_count):
+    timings = []
+    count = len(environs)
+    clock = time.perf_counter_ns
+    for i in range(request_count):
+        environ = environs[i % count]
+        start = clock()
+        call(environ)
+        timings.append(clock() - start)
+    return timings
+
+
+def measure_allocations(call, environs, request_count):
+    """
+    Return the peak memory allocated while handling each request, and the
+    total number of memory blocks still allocated after all of them
+    """
+    peak_bytes = []
+    count = len(environs)
+    tracemalloc.start()
+    try:
+        blocks_before = sys.getallocatedblocks()
+        for i in range(request_count):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            call(environs[i % count])
+            peak_bytes.append(tracemalloc.get_traced_memory()[1] - baseline)
+        retained_blocks = sys.getallocatedblocks() - blocks_before
+    finally:
+        tracemalloc.stop()
+    return peak_bytes, retained_blocks
+
+
+def percentile(sorted_values, percent):
+    index = round((len(sorted_values) - 1) * percent / 100)
+    return sorted_values[index]
+
+
+# Reporting
+
+
+def format_result(target, name, result):
+    latency = result["latency_us"]
+    return (
+        f"{target:<8}{name:<16}"
+        f"{result['requests_per_second']:>12,.0f} req/s"
+        f"  p50 {latency['p50']:>8.1f}us"
+        f"  p99 {latency['p99']:>8.1f}us"
+        f"  peak {result['peak_alloc_bytes_per_request']:>8,}B"
+    )
+
+
+def compare_results(baseline, results):
+    for target, scenarios in results.items():
+        for name, result in scenarios.items():
+            old = baseline.get(target, {}).get(name)
+            if old is None:
+                continue
+            changes = [
+                format_change(
+                    "req/s", old["requests_per_second"], result["requests_per_second"]
+                ),
+                format_change(
+                    "p50", old["latency_us"]["p50"], result["latency_us"]["p50"]
+                ),
+                format_change(
+                    "p99", old["latency_us"]["p99"], result["latency_us"]["p99"]
+                ),
+                format_change(
+                    "peak",
+                    old["peak_alloc_bytes_per_request"],
+                    result["peak_alloc_bytes_per_request"],
+                ),
+            ]
+            yield f"{target:<8}{name:<16}" + "  ".join(changes)
+
+
+def format_change(label, old, new):
+    if not old:
+        return f"{label} {new}"
+    return f"{label} {(new - old) / old:+7.1%}"
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=module_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
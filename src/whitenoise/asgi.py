@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from whitenoise.base import WhiteNoise
+
+__all__ = ["AsgiWhiteNoise"]
+
+
+class AsgiWhiteNoise(WhiteNoise):
+    """
+    Wrap an ASGI application, serving static files directly and passing all
+    other requests through.
+
+    All filesystem access (finding, opening and reading files) happens on a
+    bounded pool of threads so the event loop is never blocked.
+    """
+
+    # Size of the chunks in which file contents are read and sent
+    block_size = 64 * 1024
+
+    def __init__(
+        self, application, root=None, prefix=None, *, max_workers=None, **kwargs
+    ):
+        super().__init__(application, root, prefix, **kwargs)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="whitenoise"
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            path = get_path(scope)
+            if self.autorefresh:
+                static_file = await self.run_in_executor(self.find_file, path)
+            else:
+                static_file = self.files.get(path)
+            if static_file is not None:
+                await self.serve(static_file, scope, send)
+                return
+        await self.application(scope, receive, send)
+
+    async def serve(self, static_file, scope, send):
+        metrics = self.metrics
+        if metrics is not None:
+            start = perf_counter()
+        response = await self.run_in_executor(
+            static_file.get_response, scope["method"], get_request_headers(scope)
+        )
+        if metrics is not None:
+            metrics.record(scope["method"], response, perf_counter() - start)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": int(response.status),
+                "headers": [
+                    (key.lower().encode("latin-1"), value.encode("latin-1"))
+                    for key, value in response.headers
+                ],
+            }
+        )
+        if response.body is not None:
+            for chunk in response.body:
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+        elif response.file is not None:
+            try:
+                while True:
+                    chunk = await self.run_in_executor(
+                        response.file.read, self.block_size
+                    )
+                    if not chunk:
+                        break
+                    await send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+            finally:
+                await self.run_in_executor(response.file.close)
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    def run_in_executor(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self.executor, func, *args)
+
+
+def get_path(scope):
+    """
+    Return the request path relative to the application's root path
+    """
+    path = scope["path"]
+    root_path = scope.get("root_path", "")
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path) :]
+    return path
+
+
+def get_request_headers(scope):
+    """
+    Convert ASGI request headers into the WSGI environ style keys expected by
+    `StaticFile.get_response`
+    """
+    request_headers = {}
+    for name, value in scope["headers"]:
+        key = "HTTP_" + name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key in request_headers:
+            request_headers[key] += "," + value
+        else:
+            request_headers[key] = value
+    return request_headers
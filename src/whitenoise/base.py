@@ -2,26 +2,55 @@ from __future__ import annotations
 
 import os
 import re
+import threading
 import warnings
 from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from itertools import repeat
 from posixpath import normpath
+from time import perf_counter
 from wsgiref.headers import Headers
 from wsgiref.util import FileWrapper
 
+from whitenoise.cache import (
+    BodyCache,
+    DigestCache,
+    FileDescriptorCache,
+    LookupCache,
+    MappedFileCache,
+)
+from whitenoise.index import IndexCache, describe_callable
 from whitenoise.media_types import MediaTypes
+from whitenoise.metrics import Metrics
+from whitenoise.profiling import StartupProfiler, log_startup_report
+from whitenoise.reloader import ReloadTrigger
 from whitenoise.responders import (
+    COMPRESSED_SUFFIXES,
+    STATUS_LINES,
+    FileEntry,
     IsDirectoryError,
+    LazyStaticFile,
     MissingFileError,
     Redirect,
     StaticFile,
 )
+from whitenoise.runtime_compression import (
+    CompressedFileStore,
+    RuntimeCompressedFile,
+)
 from whitenoise.string_utils import decode_path_info, ensure_leading_trailing_slash
+from whitenoise.watcher import DirectoryWatcher, register_after_fork
 
 
 class WhiteNoise:
     # Ten years is what nginx sets a max age if you use 'expires max;'
     # so we'll follow its lead
     FOREVER = 10 * 365 * 24 * 60 * 60
+    # Number of files built by each task when `scan_workers` is set
+    SCAN_BATCH_SIZE = 256
+    # Seconds between checks of `reload_trigger_file`
+    RELOAD_CHECK_INTERVAL = 1
 
     def __init__(
         self,
@@ -33,6 +62,9 @@ class WhiteNoise:
         # automatically picked up. NOTE: For use in development only, not supported
         # in production
         autorefresh: bool = False,
+        # In autorefresh mode, remember the result of looking up each URL for
+        # this many seconds
+        autorefresh_ttl: float | None = None,
         max_age: int | None = 60,  # seconds
         # Set 'Access-Control-Allow-Origin: *' header on all files.
         # As these are all public static files this is safe (See
@@ -45,12 +77,62 @@ class WhiteNoise:
         add_headers_function: Callable[[Headers, str, str], None] | None = None,
         index_file: str | bool | None = None,
         immutable_file_test: Callable | str | None = None,
+        # Total size in bytes of small file contents to hold in memory, so
+        # that they can be served without touching the filesystem
+        memory_cache_size: int | None = None,
+        memory_cache_max_file_size: int = 16 * 1024,
+        # Derive ETags from a digest of each file's contents, optionally
+        # persisting the digests to a file so they survive restarts
+        content_etags: bool = False,
+        digest_cache_path: str | None = None,
+        # Serve files of at least this size (in bytes) from a shared memory
+        # map, keeping up to `mmap_cache_size` files mapped at once
+        mmap_min_size: int | None = None,
+        mmap_cache_size: int = 64,
+        # Compress files which have no precompressed variants when first
+        # requested, storing the results in the given directory (or a
+        # temporary one)
+        runtime_compression: bool = False,
+        runtime_compression_dir: str | None = None,
+        # Keep up to this many file descriptors open, shared between responses
+        fd_cache_size: int | None = None,
+        # Store the files index in this file, so that later processes can load
+        # it rather than scanning directories
+        index_cache_path: str | None = None,
+        # Only record the path of each file at startup, and build its headers
+        # when it is first requested
+        lazy_index: bool = False,
+        # Scan directories and build files at startup using this many threads
+        scan_workers: int | None = None,
+        # Poll directories for changes every this many seconds, updating
+        # individual files as they change
+        watch_interval: float | None = None,
+        # Record counts and timings of the responses served
+        metrics: Metrics | None = None,
+        # Time each phase of adding files, logging the results or passing
+        # them to the given function
+        startup_report: bool | Callable[[dict], None] = False,
+        # Rebuild the files dictionary whenever this file's modification time
+        # changes
+        reload_trigger_file: str | None = None,
+        # Remember the contents of each directory, so that `reload` only
+        # rescans directories which have changed
+        incremental_reload: bool = False,
     ):
         self.autorefresh = autorefresh
         self.max_age = max_age
         self.allow_all_origins = allow_all_origins
         self.charset = charset
         self.add_headers_function = add_headers_function
+        self.lazy_index = lazy_index
+        self.scan_workers = scan_workers
+        self.metrics = metrics
+        if startup_report is True:
+            self.startup_report: Callable[[dict], None] | None = log_startup_report
+        elif callable(startup_report):
+            self.startup_report = startup_report
+        else:
+            self.startup_report = None
         if index_file is True:
             self.index_file: str | None = "index.html"
         elif isinstance(index_file, str):
@@ -65,12 +147,86 @@ class WhiteNoise:
             else:
                 self.immutable_file_test = immutable_file_test
 
+        if memory_cache_size:
+            self.body_cache: BodyCache | None = BodyCache(
+                memory_cache_size, memory_cache_max_file_size
+            )
+        else:
+            self.body_cache = None
+
+        if mmap_min_size is not None and mmap_cache_size:
+            self.mmap_cache: MappedFileCache | None = MappedFileCache(
+                mmap_cache_size, mmap_min_size
+            )
+        else:
+            self.mmap_cache = None
+
+        if runtime_compression:
+            self.compression_store: CompressedFileStore | None = CompressedFileStore(
+                runtime_compression_dir
+            )
+        else:
+            self.compression_store = None
+
+        # Shared descriptors are read with `os.pread`, which isn't available
+        # on Windows
+        if fd_cache_size and hasattr(os, "pread"):
+            self.fd_cache: FileDescriptorCache | None = FileDescriptorCache(
+                fd_cache_size
+            )
+        else:
+            self.fd_cache = None
+
+        if content_etags:
+            self.digest_cache: DigestCache | None = DigestCache(digest_cache_path)
+        else:
+            self.digest_cache = None
+
         self.media_types = MediaTypes(extra_types=mimetypes)
+        if index_cache_path is not None:
+            fingerprint = [
+                max_age,
+                allow_all_origins,
+                charset,
+                mimetypes,
+                describe_callable(add_headers_function),
+                self.index_file,
+                immutable_file_test
+                if isinstance(immutable_file_test, str)
+                else describe_callable(self.immutable_file_test),
+                content_etags,
+                lazy_index,
+            ]
+            self.index_cache: IndexCache | None = IndexCache(
+                index_cache_path, fingerprint
+            )
+        else:
+            self.index_cache = None
         self.application = application
         self.files = {}
         self.directories = []
+        self.reload_lock = threading.Lock()
+        register_after_fork(self.after_fork)
+        if autorefresh and autorefresh_ttl:
+            self.lookup_cache: LookupCache | None = LookupCache(autorefresh_ttl)
+        else:
+            self.lookup_cache = None
+        if (watch_interval is not None or incremental_reload) and not autorefresh:
+            # Without an interval the watcher only checks for changes when
+            # `reload` is called
+            self.watcher: DirectoryWatcher | None = DirectoryWatcher(
+                self, watch_interval
+            )
+        else:
+            self.watcher = None
         if root is not None:
             self.add_files(root, prefix)
+        if reload_trigger_file is not None and not autorefresh:
+            self.reload_trigger: ReloadTrigger | None = ReloadTrigger(
+                self, reload_trigger_file, self.RELOAD_CHECK_INTERVAL
+            )
+        else:
+            self.reload_trigger = None
 
     def __call__(self, environ, start_response):
         path = decode_path_info(environ.get("PATH_INFO", ""))
@@ -83,11 +239,19 @@ class WhiteNoise:
         else:
             return self.serve(static_file, environ, start_response)
 
-    @staticmethod
-    def serve(static_file, environ, start_response):
-        response = static_file.get_response(environ["REQUEST_METHOD"], environ)
-        status_line = f"{response.status} {response.status.phrase}"
-        start_response(status_line, list(response.headers))
+    def serve(self, static_file, environ, start_response):
+        metrics = self.metrics
+        if metrics is not None:
+            start = perf_counter()
+        method = environ["REQUEST_METHOD"]
+        response = static_file.get_response(method, environ)
+        # Response header lists are built once and shared between requests,
+        # so pass on a copy as servers and middleware may modify the list
+        start_response(STATUS_LINES[response.status], list(response.headers))
+        if metrics is not None:
+            metrics.record(method, response, perf_counter() - start)
+        if response.body is not None:
+            return response.body
         if response.file is not None:
             file_wrapper = environ.get("wsgi.file_wrapper", FileWrapper)
             return file_wrapper(response.file)
@@ -105,33 +269,205 @@ class WhiteNoise:
             self.directories.insert(0, (root, prefix))
         else:
             if os.path.isdir(root):
-                self.update_files_dictionary(root, prefix)
+                with self.profile_startup(root, prefix):
+                    # Kept in the same order as in autorefresh mode, for use
+                    # by the watcher and `reload`
+                    self.directories.insert(0, (root, prefix))
+                    if self.index_cache is not None:
+                        self.add_files_from_index_cache(root, prefix)
+                    else:
+                        self.update_files_dictionary(root, prefix)
+                    if self.watcher is not None:
+                        self.watcher.watch(root, prefix)
+                    if self.digest_cache is not None:
+                        self.digest_cache.save()
             else:
                 warnings.warn(f"No directory at: {root}", stacklevel=3)
 
-    def update_files_dictionary(self, root, prefix):
-        # Build a mapping from paths to the results of `os.stat` calls
-        # so we only have to touch the filesystem once
-        stat_cache = dict(scantree(root))
-        for path in stat_cache:
+    def reload(self, full=False):
+        """
+        Rebuild the files dictionary for every directory added so far, then
+        replace the existing one with it in a single step. Requests continue
+        to be served from the old dictionary while the new one is built, and
+        those already in progress finish with the files they started with.
+
+        If directories are being tracked (with `incremental_reload` or
+        `watch_interval`) only those which have changed since they were last
+        listed are rescanned, unless `full` is True.
+        """
+        if self.autorefresh:
+            # Files are looked up afresh on every request anyway
+            return
+        # Stop the watcher from changing the old dictionary while the new one
+        # is built, as those changes would be lost
+        lock = self.watcher.lock if self.watcher is not None else self.reload_lock
+        with lock:
+            if self.watcher is not None and not full:
+                # Unchanged entries are carried over from a copy of the old
+                # dictionary, and only the changed ones replaced
+                files = dict(self.files)
+                self.watcher.update(files)
+            else:
+                files = {}
+                self.reload_files(files)
+            self.files = files
+        if self.digest_cache is not None:
+            self.digest_cache.save()
+
+    def after_fork(self):
+        # Another of the parent's threads may have been holding the lock at
+        # the time, and it would never be released in the child
+        self.reload_lock = threading.Lock()
+
+    def reload_files(self, files):
+        """
+        Add the files from each directory added so far to `files`, in the
+        order the directories were added
+        """
+        for root, prefix in reversed(self.directories):
+            if self.index_cache is not None:
+                signature = self.index_cache.get_signature(root)
+            root_files = {}
+            self.update_files_dictionary(root, prefix, files=root_files)
+            if self.index_cache is not None:
+                self.index_cache.set_files(root, prefix, root_files, signature)
+            files.update(root_files)
+
+    @contextmanager
+    def profile_startup(self, source, prefix):
+        """
+        If `startup_report` is set, time the phases of adding files within
+        this block and report on the files added
+        """
+        if self.startup_report is None:
+            yield
+            return
+        profiler = StartupProfiler()
+        profiler.instrument(self, "scan_root", "scan")
+        profiler.instrument(self, "scan_finders", "scan")
+        profiler.instrument(self, "add_mime_headers", "media_types")
+        profiler.instrument(self, "immutable_file_test", "immutable_file_test")
+        profiler.instrument(self, "add_etag_header", "etags")
+        profiler.instrument(self, "add_headers_function", "add_headers_function")
+        profiler.instrument(self, "create_static_file", "static_files")
+        if self.index_cache is not None:
+            profiler.instrument(self.index_cache, "get_files", "index_cache")
+            profiler.instrument(self.index_cache, "set_files", "index_cache")
+            profiler.instrument(self.index_cache, "get_signature", "index_cache")
+        if self.watcher is not None:
+            profiler.instrument(self.watcher, "watch", "watcher")
+        files_before = dict(self.files)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            seconds = perf_counter() - start
+            profiler.restore()
+        responders = [
+            value
+            for url, value in self.files.items()
+            if files_before.get(url) is not value
+        ]
+        self.startup_report(profiler.get_report(source, prefix, seconds, responders))
+
+    def add_files_from_index_cache(self, root, prefix):
+        files = self.index_cache.get_files(self, root, prefix)
+        if files is None:
+            signature = self.index_cache.get_signature(root)
+            files = {}
+            self.update_files_dictionary(root, prefix, files=files)
+            self.index_cache.set_files(root, prefix, files, signature)
+        self.files.update(files)
+
+    def update_files_dictionary(self, root, prefix, files=None):
+        if self.scan_workers:
+            with ThreadPoolExecutor(
+                max_workers=self.scan_workers, thread_name_prefix="whitenoise-scan"
+            ) as executor:
+                self.update_files_dictionary_parallel(root, prefix, files, executor)
+            return
+        stat_cache = self.scan_root(root)
+        for url, path in self.get_urls_for_paths(root, prefix, stat_cache):
+            self.add_file_to_dictionary(url, path, stat_cache=stat_cache, files=files)
+
+    def update_files_dictionary_parallel(self, root, prefix, files, executor):
+        """
+        As `update_files_dictionary`, but scanning directories and building
+        files concurrently on `executor`. Files are added in the same order as
+        a serial scan would add them.
+        """
+        if files is None:
+            files = self.files
+        stat_cache = self.scan_root(root, executor)
+        urls = list(self.get_urls_for_paths(root, prefix, stat_cache))
+        # Build files in batches, as a task per file would cost more in
+        # overhead than it saves
+        batches = [
+            urls[i : i + self.SCAN_BATCH_SIZE]
+            for i in range(0, len(urls), self.SCAN_BATCH_SIZE)
+        ]
+        for batch_files in executor.map(
+            self.build_files_dictionary, batches, repeat(stat_cache)
+        ):
+            files.update(batch_files)
+
+    def scan_root(self, root, executor=None):
+        """
+        Return a dict mapping the path of every file under `root` to the
+        result of calling `os.stat` on it, or to None in `lazy_index` mode
+        """
+        if self.watcher is not None:
+            # Record the contents of each directory as it's scanned, rather
+            # than listing everything a second time to track changes
+            return self.watcher.scan(root, stat_files=not self.lazy_index)
+        if executor is not None:
+            return dict(
+                scantree_parallel(root, executor, stat_files=not self.lazy_index)
+            )
+        if self.lazy_index:
+            # Files are only stat'd once they're requested, so we just need
+            # to know which paths exist
+            return dict.fromkeys(scanpaths(root))
+        # Build a mapping from paths to the results of `os.stat` calls so we
+        # only have to touch the filesystem once
+        return dict(scantree(root))
+
+    def build_files_dictionary(self, urls, stat_cache):
+        files = {}
+        for url, path in urls:
+            self.add_file_to_dictionary(url, path, stat_cache=stat_cache, files=files)
+        return files
+
+    @staticmethod
+    def get_urls_for_paths(root, prefix, paths):
+        for path in paths:
             relative_path = path[len(root) :]
             relative_url = relative_path.replace("\\", "/")
-            url = prefix + relative_url
-            self.add_file_to_dictionary(url, path, stat_cache=stat_cache)
+            yield prefix + relative_url, path
 
-    def add_file_to_dictionary(self, url, path, stat_cache=None):
+    def add_file_to_dictionary(self, url, path, stat_cache=None, files=None):
+        if files is None:
+            files = self.files
         if self.is_compressed_variant(path, stat_cache=stat_cache):
             return
         if self.index_file is not None and url.endswith("/" + self.index_file):
             index_url = url[: -len(self.index_file)]
             index_no_slash = index_url.rstrip("/")
-            self.files[url] = self.redirect(url, index_url)
-            self.files[index_no_slash] = self.redirect(index_no_slash, index_url)
+            files[url] = self.redirect(url, index_url)
+            files[index_no_slash] = self.redirect(index_no_slash, index_url)
             url = index_url
-        static_file = self.get_static_file(path, url, stat_cache=stat_cache)
-        self.files[url] = static_file
+        if self.lazy_index:
+            static_file = LazyStaticFile(self.get_static_file, path, url)
+        else:
+            static_file = self.get_static_file(path, url, stat_cache=stat_cache)
+        files[url] = static_file
 
     def find_file(self, url):
+        if self.lookup_cache is not None:
+            return self.lookup_cache.get(url, self.find_file_uncached)
+        return self.find_file_uncached(url)
+
+    def find_file_uncached(self, url):
         # Optimization: bail early if the URL can never match a file
         if self.index_file is None and url.endswith("/"):
             return
@@ -195,8 +531,8 @@ class WhiteNoise:
 
     @staticmethod
     def is_compressed_variant(path, stat_cache=None):
-        if path[-3:] in (".gz", ".br"):
-            uncompressed_path = path[:-3]
+        if path.endswith(COMPRESSED_SUFFIXES):
+            uncompressed_path = os.path.splitext(path)[0]
             if stat_cache is None:
                 return os.path.isfile(uncompressed_path)
             else:
@@ -210,17 +546,50 @@ class WhiteNoise:
         headers = Headers([])
         self.add_mime_headers(headers, path, url)
         self.add_cache_headers(headers, path, url)
+        if self.digest_cache is not None:
+            self.add_etag_header(headers, path, stat_cache)
         if self.allow_all_origins:
             headers["Access-Control-Allow-Origin"] = "*"
         if self.add_headers_function is not None:
             self.add_headers_function(headers, path, url)
-        return StaticFile(
+        return self.create_static_file(
             path,
             headers.items(),
+            {"gzip": path + ".gz", "br": path + ".br", "zstd": path + ".zst"},
             stat_cache=stat_cache,
-            encodings={"gzip": path + ".gz", "br": path + ".br"},
         )
 
+    def create_static_file(self, path, headers, encodings, stat_cache=None):
+        static_file = StaticFile(
+            path,
+            headers,
+            stat_cache=stat_cache,
+            encodings=encodings,
+            body_cache=self.body_cache,
+            mmap_cache=self.mmap_cache,
+            fd_cache=self.fd_cache,
+        )
+        if self.compression_store is not None and len(static_file.alternatives) == 1:
+            _, file_entry, response = static_file.alternatives[0]
+            if self.compression_store.should_compress(file_entry):
+                # Responses will vary once the file has been compressed, so
+                # caches need to know that from the start. Headers loaded from
+                # the index cache may already include this.
+                headers = Headers(list(response.headers))
+                headers["Vary"] = "Accept-Encoding"
+                static_file = StaticFile(
+                    path,
+                    headers.items(),
+                    stat_cache=stat_cache,
+                    body_cache=self.body_cache,
+                    mmap_cache=self.mmap_cache,
+                    fd_cache=self.fd_cache,
+                )
+                return RuntimeCompressedFile(
+                    static_file, self.compression_store, self.create_static_file
+                )
+        return static_file
+
     def add_mime_headers(self, headers, path, url):
         media_type = self.media_types.get_type(path)
         if media_type.startswith("text/"):
@@ -229,6 +598,11 @@ class WhiteNoise:
             params = {}
         headers.add_header("Content-Type", str(media_type), **params)
 
+    def add_etag_header(self, headers, path, stat_cache=None):
+        stat_function = os.stat if stat_cache is None else stat_cache.__getitem__
+        stat_result = FileEntry.stat_regular_file(path, stat_function)
+        headers["ETag"] = self.digest_cache.get_etag(path, stat_result)
+
     def add_cache_headers(self, headers, path, url):
         if self.immutable_file_test(path, url):
             headers["Cache-Control"] = f"max-age={self.FOREVER}, public, immutable"
@@ -271,3 +645,54 @@ def scantree(root):
             yield from scantree(entry.path)
         else:
             yield entry.path, entry.stat()
+
+
+def scanpaths(root):
+    """
+    Recurse the given directory yielding the path of each file
+    """
+    for entry in os.scandir(root):
+        if entry.is_dir():
+            yield from scanpaths(entry.path)
+        else:
+            yield entry.path
+
+
+def scantree_parallel(root, executor, stat_files=True):
+    """
+    As `scantree`, but listing directories concurrently on `executor`. The
+    results are yielded in the same order as `scantree` would yield them, with
+    stat results of None if `stat_files` is False.
+    """
+    listings = {}
+    pending = {executor.submit(list_directory, root, stat_files): root}
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            directory = pending.pop(future)
+            listing = listings[directory] = future.result()
+            for path, is_dir, _ in listing:
+                if is_dir:
+                    pending[executor.submit(list_directory, path, stat_files)] = path
+    yield from flatten_listings(listings, root)
+
+
+def list_directory(directory, stat_files):
+    """
+    Return an (path, is_dir, stat_result) tuple for each entry in `directory`
+    """
+    listing = []
+    for entry in os.scandir(directory):
+        if entry.is_dir():
+            listing.append((entry.path, True, None))
+        else:
+            listing.append((entry.path, False, entry.stat() if stat_files else None))
+    return listing
+
+
+def flatten_listings(listings, directory):
+    for path, is_dir, stat_result in listings[directory]:
+        if is_dir:
+            yield from flatten_listings(listings, path)
+        else:
+            yield path, stat_result
@@ -0,0 +1,400 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+import warnings
+from collections import OrderedDict
+
+from whitenoise.responders import MappedFile, PreadFile
+
+
+class BodyCache:
+    """
+    Holds the contents of small files in memory so they can be served without
+    touching the filesystem.
+
+    Entries are keyed by path, size and mtime so that a file which changes on
+    disk (and so gets a new `StaticFile` in autorefresh mode) never serves
+    stale content. The least recently used entries are evicted once the total
+    size of cached bodies exceeds `max_size` bytes.
+    """
+
+    def __init__(self, max_size, max_file_size=16 * 1024):
+        self.max_size = max_size
+        self.max_file_size = min(max_file_size, max_size)
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, file_entry):
+        """
+        Return the contents of `file_entry` as bytes, or None if the file is
+        too large to be cached
+        """
+        if file_entry.size > self.max_file_size:
+            return None
+        key = (file_entry.path, file_entry.size, file_entry.mtime)
+        with self.lock:
+            try:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            except KeyError:
+                pass
+        with open(file_entry.path, "rb") as f:
+            data = f.read()
+        # The file has changed since we last looked at it, so don't cache
+        # content which doesn't match the headers we're going to send
+        if len(data) != file_entry.size:
+            return None
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = data
+                self.size += len(data)
+                while self.size > self.max_size:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.size -= len(evicted)
+        return data
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class FileDescriptorCache:
+    """
+    Keeps read-only file descriptors open so that responses can share them,
+    rather than opening and closing the file for every request.
+
+    Entries are keyed by path, size and mtime, and a descriptor is only
+    cached if the file it refers to still has the size and mtime expected.
+    Because an open descriptor keeps referring to the same inode, a file which
+    is replaced on disk never serves content mixed from old and new versions.
+    Once more than `max_entries` descriptors are cached the least recently used
+    is evicted, and closed as soon as no response is using it.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def open(self, file_entry):
+        """
+        Return a `PreadFile` reading from a shared descriptor for
+        `file_entry`, or None if the file no longer matches it
+        """
+        key = (file_entry.path, file_entry.size, file_entry.mtime)
+        with self.lock:
+            descriptor = self.entries.get(key)
+            if descriptor is not None:
+                self.entries.move_to_end(key)
+                return self.acquire(descriptor, file_entry.size)
+        fd = os.open(file_entry.path, os.O_RDONLY)
+        stat_result = os.fstat(fd)
+        if (stat_result.st_size, stat_result.st_mtime) != key[1:]:
+            os.close(fd)
+            return None
+        evicted = []
+        with self.lock:
+            descriptor = self.entries.get(key)
+            if descriptor is not None:
+                # Another thread opened the same file first
+                evicted.append(fd)
+            else:
+                descriptor = self.entries[key] = SharedDescriptor(fd)
+                while len(self.entries) > self.max_entries:
+                    _, oldest = self.entries.popitem(last=False)
+                    oldest.evicted = True
+                    if oldest.users == 0:
+                        evicted.append(oldest.fd)
+            shared_file = self.acquire(descriptor, file_entry.size)
+        for fd in evicted:
+            os.close(fd)
+        return shared_file
+
+    def acquire(self, descriptor, size):
+        descriptor.users += 1
+        return PreadFile(
+            descriptor.fd, size, functools.partial(self.release, descriptor)
+        )
+
+    def release(self, descriptor):
+        with self.lock:
+            descriptor.users -= 1
+            close = descriptor.evicted and descriptor.users == 0
+        if close:
+            os.close(descriptor.fd)
+
+    def clear(self):
+        evicted = []
+        with self.lock:
+            for descriptor in self.entries.values():
+                descriptor.evicted = True
+                if descriptor.users == 0:
+                    evicted.append(descriptor.fd)
+            self.entries.clear()
+        for fd in evicted:
+            os.close(fd)
+
+
+class MappedFileCache:
+    """
+    Keeps read-only memory maps of files of at least `min_size` bytes so that
+    responses can share them.
+
+    As with `FileDescriptorCache`, entries are keyed by path, size and mtime,
+    the least recently used map is evicted once more than `max_entries` are
+    cached, and an evicted map is closed as soon as no response is using it.
+    Where supported, maps don't keep their own duplicate of the file
+    descriptor, so they don't count towards the process's open files.
+    """
+
+    def __init__(self, max_entries, min_size):
+        self.max_entries = max_entries
+        self.min_size = max(min_size, 1)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def open(self, file_entry):
+        """
+        Return a `MappedFile` reading from a shared map of `file_entry`, or
+        None if the file is too small or no longer matches it
+        """
+        if file_entry.size < self.min_size:
+            return None
+        key = (file_entry.path, file_entry.size, file_entry.mtime)
+        with self.lock:
+            shared_map = self.entries.get(key)
+            if shared_map is not None:
+                self.entries.move_to_end(key)
+                return self.acquire(shared_map)
+        with open(file_entry.path, "rb") as f:
+            stat_result = os.fstat(f.fileno())
+            # Don't map a file which no longer matches the Content-Length
+            # we're going to send
+            if (stat_result.st_size, stat_result.st_mtime) != key[1:]:
+                return None
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ, **MMAP_OPTIONS)
+        evicted = []
+        with self.lock:
+            shared_map = self.entries.get(key)
+            if shared_map is not None:
+                # Another thread mapped the same file first
+                evicted.append(mapped)
+            else:
+                shared_map = self.entries[key] = SharedMap(mapped)
+                while len(self.entries) > self.max_entries:
+                    _, oldest = self.entries.popitem(last=False)
+                    oldest.evicted = True
+                    if oldest.users == 0:
+                        evicted.append(oldest.mapped)
+            mapped_file = self.acquire(shared_map)
+        for mapped in evicted:
+            mapped.close()
+        return mapped_file
+
+    def acquire(self, shared_map):
+        shared_map.users += 1
+        return MappedFile(
+            shared_map.mapped, functools.partial(self.release, shared_map)
+        )
+
+    def release(self, shared_map):
+        with self.lock:
+            shared_map.users -= 1
+            close = shared_map.evicted and shared_map.users == 0
+        if close:
+            shared_map.mapped.close()
+
+    def clear(self):
+        evicted = []
+        with self.lock:
+            for shared_map in self.entries.values():
+                shared_map.evicted = True
+                if shared_map.users == 0:
+                    evicted.append(shared_map.mapped)
+            self.entries.clear()
+        for mapped in evicted:
+            mapped.close()
+
+
+# Since Python 3.13 maps can be created without duplicating the descriptor
+if sys.version_info >= (3, 13) and os.name != "nt":
+    MMAP_OPTIONS = {"trackfd": False}
+else:
+    MMAP_OPTIONS = {}
+
+
+class SharedMap:
+    __slots__ = ("mapped", "users", "evicted")
+
+    def __init__(self, mapped):
+        self.mapped = mapped
+        self.users = 0
+        self.evicted = False
+
+
+class SharedDescriptor:
+    __slots__ = ("fd", "users", "evicted")
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.users = 0
+        self.evicted = False
+
+
+class LookupCache:
+    """
+    Remembers the results of looking up URLs in autorefresh mode for `ttl`
+    seconds, including lookups which found no file.
+
+    When several threads look up the same URL at once only one of them
+    touches the filesystem, and the others wait for its result. At most
+    `max_entries` URLs are remembered, evicting the oldest first.
+    """
+
+    def __init__(self, ttl, max_entries=4096):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def get(self, url, find_file):
+        """
+        Return the cached result for `url`, calling `find_file(url)` if there
+        isn't an unexpired one
+        """
+        with self.lock:
+            entry = self.get_entry(url)
+            if entry is not None:
+                return entry[1]
+            event = self.pending.get(url)
+            if event is None:
+                self.pending[url] = threading.Event()
+        if event is not None:
+            event.wait()
+            with self.lock:
+                entry = self.get_entry(url)
+            if entry is not None:
+                return entry[1]
+            # The other lookup failed, so try for ourselves
+            return find_file(url)
+        try:
+            result = find_file(url)
+            with self.lock:
+                self.entries[url] = (time.monotonic() + self.ttl, result)
+                self.entries.move_to_end(url)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            return result
+        finally:
+            with self.lock:
+                self.pending.pop(url).set()
+
+    def get_entry(self, url):
+        entry = self.entries.get(url)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry
+        return None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class DigestCache:
+    """
+    Computes digests of file contents for use as ETags.
+
+    Digests are remembered by path, keyed on size and mtime so that changed
+    files are hashed again. If `path` is given the digests are persisted to
+    that file, so that restarting the process doesn't mean re-reading every
+    file.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path=None):
+        self.path = path
+        self.digests = self.load()
+        # Only entries used by this process are saved, so that records of
+        # deleted files get dropped
+        self.used = {}
+        self.changed = False
+        self.lock = threading.Lock()
+
+    def get_etag(self, path, stat_result):
+        return f'"{self.get_digest(path, stat_result)}"'
+
+    def get_digest(self, path, stat_result):
+        key = [stat_result.st_size, stat_result.st_mtime]
+        entry = self.digests.get(path)
+        if entry is not None and entry[:2] == key:
+            digest = entry[2]
+        else:
+            digest = self.hash_file(path)
+            self.changed = True
+        with self.lock:
+            self.digests[path] = self.used[path] = key + [digest]
+        return digest
+
+    @staticmethod
+    def hash_file(path):
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            while chunk := f.read(64 * 1024):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def load(self):
+        if self.path is None:
+            return {}
+        data = load_json_file(self.path, "digest cache")
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            return {}
+        return data["digests"]
+
+    def save(self):
+        if self.path is None or not self.changed:
+            return
+        with self.lock:
+            data = {"version": self.VERSION, "digests": dict(self.used)}
+            self.changed = False
+        save_json_file(self.path, data, "digest cache")
+
+
+def load_json_file(path, description):
+    """
+    Return the data in the JSON file at `path`, or None if there is no such
+    file or it can't be read, warning in the latter case
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        warnings.warn(f"Ignoring unreadable {description} {path}: {e}", stacklevel=3)
+        return None
+
+
+def save_json_file(path, data, description):
+    """
+    Write `data` to the JSON file at `path`, replacing it atomically so that
+    other processes never read a partly written file
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        warnings.warn(f"Unable to write {description} {path}: {e}", stacklevel=3)
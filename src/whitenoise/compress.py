@@ -14,6 +14,22 @@ try:
 except ImportError:  # pragma: no cover
     brotli_installed = False
 
+try:
+    # Python 3.14+
+    from compression.zstd import compress as zstd_compress
+
+    zstd_installed = True
+except ImportError:  # pragma: no cover
+    try:
+        import zstandard
+
+        def zstd_compress(data, level):
+            return zstandard.ZstdCompressor(level=level).compress(data)
+
+        zstd_installed = True
+    except ImportError:
+        zstd_installed = False
+
 
 class Compressor:
     # Extensions that it's not worth trying to compress
@@ -32,6 +48,7 @@ class Compressor:
         "tbz",
         "xz",
         "br",
+        "zst",
         # Flash
         "swf",
         "flv",
@@ -53,13 +70,20 @@ class Compressor:
     )
 
     def __init__(
-        self, extensions=None, use_gzip=True, use_brotli=True, log=print, quiet=False
+        self,
+        extensions=None,
+        use_gzip=True,
+        use_brotli=True,
+        log=print,
+        quiet=False,
+        use_zstd=False,
     ):
         if extensions is None:
             extensions = self.SKIP_COMPRESS_EXTENSIONS
         self.extension_re = self.get_extension_re(extensions)
         self.use_gzip = use_gzip
         self.use_brotli = use_brotli and brotli_installed
+        self.use_zstd = use_zstd and zstd_installed
         if not quiet:
             self.log = log
 
@@ -89,7 +113,15 @@ class Compressor:
             if self.is_compressed_effectively("Brotli", path, size, compressed):
                 filenames.append(self.write_data(path, compressed, ".br", stat_result))
             else:
-                # If Brotli compression wasn't effective gzip won't be either
+                # If Brotli compression wasn't effective the others won't be
+                # either
+                return filenames
+        if self.use_zstd:
+            compressed = self.compress_zstd(data)
+            if self.is_compressed_effectively("Zstandard", path, size, compressed):
+                filenames.append(self.write_data(path, compressed, ".zst", stat_result))
+            elif not self.use_brotli:
+                # If Zstandard compression wasn't effective gzip won't be either
                 return filenames
         if self.use_gzip:
             compressed = self.compress_gzip(data)
@@ -112,6 +144,10 @@ class Compressor:
     def compress_brotli(data):
         return brotli.compress(data)
 
+    @staticmethod
+    def compress_zstd(data):
+        return zstd_compress(data, level=19)
+
     def is_compressed_effectively(self, encoding_name, path, orig_size, data):
         compressed_size = len(data)
         if orig_size == 0:
@@ -139,7 +175,8 @@ def main(argv=None):
     parser = argparse.ArgumentParser(
         description="Search for all files inside <root> *not* matching "
         "<extensions> and produce compressed versions with "
-        "'.gz' and '.br' suffixes (as long as this results in a "
+        "'.gz' and '.br' (and optionally '.zst') suffixes (as long as this "
+        "results in a "
         "smaller file)"
     )
     parser.add_argument(
@@ -157,6 +194,12 @@ def main(argv=None):
         action="store_false",
         dest="use_brotli",
     )
+    parser.add_argument(
+        "--zstd",
+        help="Also produce Zstandard '.zst' files",
+        action="store_true",
+        dest="use_zstd",
+    )
     parser.add_argument("root", help="Path root from which to search for files")
     default_exclude = ", ".join(Compressor.SKIP_COMPRESS_EXTENSIONS)
     parser.add_argument(
@@ -174,6 +217,7 @@ def main(argv=None):
         extensions=args.extensions,
         use_gzip=args.use_gzip,
         use_brotli=args.use_brotli,
+        use_zstd=args.use_zstd,
         quiet=args.quiet,
     )
 
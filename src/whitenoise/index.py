@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import os
+import stat
+import threading
+from collections import namedtuple
+from urllib.parse import unquote
+
+from whitenoise.cache import load_json_file, save_json_file
+from whitenoise.responders import LazyStaticFile, Redirect
+from whitenoise.runtime_compression import RuntimeCompressedFile
+
+# The subset of `os.stat_result` which `StaticFile` relies on
+StatResult = namedtuple("StatResult", ["st_mode", "st_size", "st_mtime"])
+
+
+class IndexCache:
+    """
+    Persists the `files` dictionary built for each root directory, so that
+    later processes can load it instead of scanning the directory and
+    building headers for every file.
+
+    Each root is stored with a signature made from the modification times of
+    every directory within it and of any `staticfiles.json` manifest, and the
+    file as a whole is tied to a fingerprint of the configuration used to
+    build it. If either doesn't match the root is scanned as normal and the
+    result written back. Adding, removing or renaming a file anywhere in the
+    tree changes the modification time of its directory, so checking the
+    signature costs one `stat` call per directory rather than one per file.
+    """
+
+    VERSION = 2
+    MANIFEST_NAME = "staticfiles.json"
+
+    def __init__(self, path, fingerprint):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.roots = self.load()
+        self.lock = threading.Lock()
+
+    def get_files(self, whitenoise, root, prefix):
+        """
+        Return the files dictionary previously stored for `root` and `prefix`,
+        or None if there isn't one or it is stale
+        """
+        entry = self.roots.get(self.get_key(root, prefix))
+        if entry is None or not self.is_signature_valid(root, entry["signature"]):
+            return None
+        files = {}
+        for url, data in entry["files"]:
+            files[url] = load_responder(whitenoise, url, data)
+        return files
+
+    def set_files(self, root, prefix, files, signature):
+        """
+        Store `files` for `root` and `prefix`, with a `signature` taken
+        before the directory was scanned
+        """
+        entry = {
+            "signature": signature,
+            "files": [[url, dump_responder(value)] for url, value in files.items()],
+        }
+        with self.lock:
+            self.roots[self.get_key(root, prefix)] = entry
+            data = {
+                "version": self.VERSION,
+                "fingerprint": self.fingerprint,
+                "roots": dict(self.roots),
+            }
+        self.save(data)
+
+    @staticmethod
+    def get_key(root, prefix):
+        return f"{prefix} {root}"
+
+    @classmethod
+    def get_signature(cls, root):
+        directories = {}
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            # Get the mtime before listing, so that any changes made while
+            # we're scanning make the stored index stale
+            directories[os.path.relpath(directory, root)] = os.stat(
+                directory
+            ).st_mtime_ns
+            with os.scandir(directory) as entries:
+                pending.extend(entry.path for entry in entries if entry.is_dir())
+        return {
+            "manifest": cls.get_manifest_signature(root),
+            "directories": directories,
+        }
+
+    @classmethod
+    def get_manifest_signature(cls, root):
+        try:
+            stat_result = os.stat(os.path.join(root, cls.MANIFEST_NAME))
+        except FileNotFoundError:
+            return None
+        return [stat_result.st_mtime_ns, stat_result.st_size]
+
+    @classmethod
+    def is_signature_valid(cls, root, signature):
+        if signature["manifest"] != cls.get_manifest_signature(root):
+            return False
+        # Any directory added or removed changes the modification time of its
+        # parent, so only the directories stored need checking
+        for relative_path, mtime in signature["directories"].items():
+            try:
+                stat_result = os.stat(os.path.join(root, relative_path))
+            except (FileNotFoundError, NotADirectoryError):
+                return False
+            if stat_result.st_mtime_ns != mtime:
+                return False
+        return True
+
+    def load(self):
+        data = load_json_file(self.path, "index cache")
+        if (
+            not isinstance(data, dict)
+            or data.get("version") != self.VERSION
+            or data.get("fingerprint") != self.fingerprint
+        ):
+            return {}
+        return data["roots"]
+
+    def save(self, data):
+        save_json_file(self.path, data, "index cache")
+
+
+def dump_responder(responder):
+    """
+    Return a JSON serializable description of a `StaticFile` or `Redirect`
+    """
+    if isinstance(responder, LazyStaticFile):
+        return {"lazy": responder.path}
+    if isinstance(responder, RuntimeCompressedFile):
+        # The wrapper is recreated by `create_static_file` when loading
+        responder = responder.static_file
+    if isinstance(responder, Redirect):
+        headers = {}
+        location = None
+        for key, value in responder.response.headers:
+            if key == "Location":
+                location = unquote(value)
+            else:
+                headers[key] = value
+        return {"redirect": location, "headers": headers}
+    # The headers of the unencoded alternative already include the generated
+    # Last-Modified and ETag values, so these don't need computing again
+    _, _, response = responder.alternatives[responder.encodings.index(None)]
+    return {
+        "headers": response.headers,
+        "files": [
+            [encoding, file_entry.path, file_entry.size, file_entry.mtime]
+            for encoding, file_entry, _ in responder.alternatives
+        ],
+    }
+
+
+def load_responder(whitenoise, url, data):
+    if "lazy" in data:
+        return LazyStaticFile(whitenoise.get_static_file, data["lazy"], url)
+    if "redirect" in data:
+        return Redirect(data["redirect"], headers=data["headers"])
+    stat_cache = {}
+    encodings = {}
+    for encoding, path, size, mtime in data["files"]:
+        stat_cache[path] = StatResult(stat.S_IFREG, size, mtime)
+        if encoding is None:
+            main_path = path
+        else:
+            encodings[encoding] = path
+    headers = [tuple(header) for header in data["headers"]]
+    return whitenoise.create_static_file(main_path, headers, encodings, stat_cache)
+
+
+def describe_callable(func):
+    """
+    Return a stable name for `func` for use in the configuration fingerprint
+    """
+    if func is None:
+        return None
+    func = getattr(func, "__func__", func)
+    module = getattr(func, "__module__", None)
+    name = getattr(func, "__qualname__", None) or type(func).__qualname__
+    return f"{module}.{name}"
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import threading
+import weakref
+from bisect import bisect_left
+
+__all__ = ["Metrics"]
+
+
+class Metrics:
+    """
+    Counts the responses WhiteNoise serves: by status code, by content
+    encoding, the bytes sent for each encoding, and a histogram of the time
+    taken to prepare each response.
+
+    Each thread records into its own counters, so recording a response takes
+    no locks. `snapshot` adds up the counters of all threads.
+    """
+
+    # Upper bounds (in seconds) of the latency histogram buckets
+    LATENCY_BUCKETS = (
+        0.00005,
+        0.0001,
+        0.00025,
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        1.0,
+    )
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # (thread, counters) pairs for each thread which has recorded anything
+        self.thread_counters = []
+        # Totals from threads which have since exited
+        self.retired = Counters(len(self.LATENCY_BUCKETS))
+
+    def record(self, method, response, duration):
+        try:
+            counters = self.local.counters
+        except AttributeError:
+            counters = self.add_thread_counters()
+        status = response.status.value
+        counters.responses[status] = counters.responses.get(status, 0) + 1
+        if status == 200 or status == 206:
+            encoding = "identity"
+            length = 0
+            for key, value in response.headers:
+                if key == "Content-Encoding":
+                    encoding = value
+                elif key == "Content-Length":
+                    length = int(value)
+            counters.encodings[encoding] = counters.encodings.get(encoding, 0) + 1
+            if method != "HEAD":
+                counters.bytes[encoding] = counters.bytes.get(encoding, 0) + length
+        counters.latency[bisect_left(self.LATENCY_BUCKETS, duration)] += 1
+        counters.latency_sum += duration
+
+    def add_thread_counters(self):
+        counters = self.local.counters = Counters(len(self.LATENCY_BUCKETS))
+        with self.lock:
+            self.thread_counters.append(
+                (weakref.ref(threading.current_thread()), counters)
+            )
+        return counters
+
+    def snapshot(self):
+        """
+        Return the totals recorded so far, as a dict of plain values
+        """
+        total = Counters(len(self.LATENCY_BUCKETS))
+        with self.lock:
+            live = []
+            for thread_ref, counters in self.thread_counters:
+                thread = thread_ref()
+                if thread is None or not thread.is_alive():
+                    # The thread won't record anything more, so its counters
+                    # can be folded into the totals and forgotten
+                    self.retired.add(counters)
+                else:
+                    live.append((thread_ref, counters))
+            self.thread_counters = live
+            total.add(self.retired)
+            for _, counters in live:
+                total.add(counters)
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(self.LATENCY_BUCKETS + (float("inf"),), total.latency):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return {
+            "responses": total.responses,
+            "encodings": total.encodings,
+            "bytes": total.bytes,
+            "latency": {
+                "buckets": buckets,
+                "sum": total.latency_sum,
+                "count": cumulative,
+            },
+        }
+
+    def render_prometheus(self):
+        """
+        Return a snapshot in the Prometheus text exposition format
+        """
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP whitenoise_responses_total Responses served, by status code.",
+            "# TYPE whitenoise_responses_total counter",
+        ]
+        for status, count in sorted(snapshot["responses"].items()):
+            lines.append(f'whitenoise_responses_total{{status="{status}"}} {count}')
+        lines += [
+            "# HELP whitenoise_encoding_responses_total Successful responses "
+            "served, by content encoding.",
+            "# TYPE whitenoise_encoding_responses_total counter",
+        ]
+        for encoding, count in sorted(snapshot["encodings"].items()):
+            lines.append(
+                f'whitenoise_encoding_responses_total{{encoding="{encoding}"}} {count}'
+            )
+        lines += [
+            "# HELP whitenoise_response_bytes_total Bytes of response bodies "
+            "served, by content encoding.",
+            "# TYPE whitenoise_response_bytes_total counter",
+        ]
+        for encoding, count in sorted(snapshot["bytes"].items()):
+            lines.append(
+                f'whitenoise_response_bytes_total{{encoding="{encoding}"}} {count}'
+            )
+        latency = snapshot["latency"]
+        lines += [
+            "# HELP whitenoise_response_duration_seconds Time taken to prepare "
+            "responses.",
+            "# TYPE whitenoise_response_duration_seconds histogram",
+        ]
+        for bound, count in latency["buckets"]:
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(
+                f'whitenoise_response_duration_seconds_bucket{{le="{le}"}} {count}'
+            )
+        lines.append(f"whitenoise_response_duration_seconds_sum {latency['sum']!r}")
+        lines.append(f"whitenoise_response_duration_seconds_count {latency['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class Counters:
+    __slots__ = ("responses", "encodings", "bytes", "latency", "latency_sum")
+
+    def __init__(self, bucket_count):
+        self.responses = {}
+        self.encodings = {}
+        self.bytes = {}
+        # One more bucket than bounds, for durations above the largest bound
+        self.latency = [0] * (bucket_count + 1)
+        self.latency_sum = 0.0
+
+    def add(self, other):
+        # Copy the other thread's dicts first, which is atomic, so they can't
+        # change while we iterate
+        for name in ("responses", "encodings", "bytes"):
+            totals = getattr(self, name)
+            for key, value in dict(getattr(other, name)).items():
+                totals[key] = totals.get(key, 0) + value
+        for index, count in enumerate(list(other.latency)):
+            self.latency[index] += count
+        self.latency_sum += other.latency_sum
@@ -1,15 +1,20 @@
 from __future__ import annotations
 
 import os
+from functools import cached_property
 from posixpath import basename
+from time import perf_counter
 from urllib.parse import urlparse
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.conf import settings
 from django.contrib.staticfiles import finders
 from django.contrib.staticfiles.storage import staticfiles_storage
 from django.http import FileResponse
+from django.http.response import ResponseHeaders
 
 from whitenoise.base import WhiteNoise
+from whitenoise.reloader import ReloadTrigger
 from whitenoise.string_utils import ensure_leading_trailing_slash
 
 __all__ = ["WhiteNoiseMiddleware"]
@@ -27,19 +32,59 @@ class WhiteNoiseFileResponse(FileResponse):
         pass
 
 
+class AsyncFileIterator:
+    """
+    Read a file in chunks on a worker thread, so that streaming it doesn't
+    block the event loop
+    """
+
+    def __init__(self, file, block_size=FileResponse.block_size):
+        self.file = file
+        self.block_size = block_size
+
+    async def __aiter__(self):
+        read = sync_to_async(self.file.read, thread_sensitive=False)
+        try:
+            while True:
+                chunk = await read(self.block_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        self.file.close()
+
+
+async def aiter_body(body):
+    for chunk in body:
+        yield chunk
+
+
 class WhiteNoiseMiddleware(WhiteNoise):
     """
     Wrap WhiteNoise to allow it to function as Django middleware, rather
     than WSGI middleware.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response=None, settings=settings):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
         try:
             autorefresh: bool = settings.WHITENOISE_AUTOREFRESH
         except AttributeError:
             autorefresh = settings.DEBUG
+        try:
+            autorefresh_ttl = settings.WHITENOISE_AUTOREFRESH_TTL
+        except AttributeError:
+            autorefresh_ttl = None
         try:
             max_age = settings.WHITENOISE_MAX_AGE
         except AttributeError:
@@ -71,10 +116,79 @@ class WhiteNoiseMiddleware(WhiteNoise):
             immutable_file_test = settings.WHITENOISE_IMMUTABLE_FILE_TEST
         except AttributeError:
             immutable_file_test = None
+        try:
+            memory_cache_size = settings.WHITENOISE_MEMORY_CACHE_SIZE
+        except AttributeError:
+            memory_cache_size = None
+        try:
+            memory_cache_max_file_size = settings.WHITENOISE_MEMORY_CACHE_MAX_FILE_SIZE
+        except AttributeError:
+            memory_cache_max_file_size = 16 * 1024
+        try:
+            content_etags = settings.WHITENOISE_CONTENT_ETAGS
+        except AttributeError:
+            content_etags = False
+        try:
+            digest_cache_path = settings.WHITENOISE_DIGEST_CACHE_PATH
+        except AttributeError:
+            digest_cache_path = None
+        try:
+            mmap_min_size = settings.WHITENOISE_MMAP_MIN_SIZE
+        except AttributeError:
+            mmap_min_size = None
+        try:
+            mmap_cache_size = settings.WHITENOISE_MMAP_CACHE_SIZE
+        except AttributeError:
+            mmap_cache_size = 64
+        try:
+            runtime_compression = settings.WHITENOISE_RUNTIME_COMPRESSION
+        except AttributeError:
+            runtime_compression = False
+        try:
+            runtime_compression_dir = settings.WHITENOISE_RUNTIME_COMPRESSION_DIR
+        except AttributeError:
+            runtime_compression_dir = None
+        try:
+            fd_cache_size = settings.WHITENOISE_FD_CACHE_SIZE
+        except AttributeError:
+            fd_cache_size = None
+        try:
+            index_cache_path = settings.WHITENOISE_INDEX_CACHE_PATH
+        except AttributeError:
+            index_cache_path = None
+        try:
+            lazy_index = settings.WHITENOISE_LAZY_INDEX
+        except AttributeError:
+            lazy_index = False
+        try:
+            scan_workers = settings.WHITENOISE_SCAN_WORKERS
+        except AttributeError:
+            scan_workers = None
+        try:
+            watch_interval = settings.WHITENOISE_WATCH_INTERVAL
+        except AttributeError:
+            watch_interval = None
+        try:
+            metrics = settings.WHITENOISE_METRICS
+        except AttributeError:
+            metrics = None
+        try:
+            startup_report = settings.WHITENOISE_STARTUP_REPORT
+        except AttributeError:
+            startup_report = False
+        try:
+            reload_trigger_file = settings.WHITENOISE_RELOAD_TRIGGER_FILE
+        except AttributeError:
+            reload_trigger_file = None
+        try:
+            incremental_reload = settings.WHITENOISE_INCREMENTAL_RELOAD
+        except AttributeError:
+            incremental_reload = False
 
         super().__init__(
             application=None,
             autorefresh=autorefresh,
+            autorefresh_ttl=autorefresh_ttl,
             max_age=max_age,
             allow_all_origins=allow_all_origins,
             charset=charset,
@@ -82,6 +196,22 @@ class WhiteNoiseMiddleware(WhiteNoise):
             add_headers_function=add_headers_function,
             index_file=index_file,
             immutable_file_test=immutable_file_test,
+            memory_cache_size=memory_cache_size,
+            memory_cache_max_file_size=memory_cache_max_file_size,
+            mmap_min_size=mmap_min_size,
+            mmap_cache_size=mmap_cache_size,
+            runtime_compression=runtime_compression,
+            runtime_compression_dir=runtime_compression_dir,
+            fd_cache_size=fd_cache_size,
+            content_etags=content_etags,
+            digest_cache_path=digest_cache_path,
+            index_cache_path=index_cache_path,
+            lazy_index=lazy_index,
+            scan_workers=scan_workers,
+            watch_interval=watch_interval,
+            metrics=metrics,
+            startup_report=startup_report,
+            incremental_reload=incremental_reload,
         )
 
         try:
@@ -99,6 +229,10 @@ class WhiteNoiseMiddleware(WhiteNoise):
                     self.static_prefix = self.static_prefix[len(script_name) :]
         self.static_prefix = ensure_leading_trailing_slash(self.static_prefix)
 
+        # In DEBUG mode the storage returns unhashed URLs, so the manifest
+        # can't be used to tell which files are immutable
+        self.use_manifest = not settings.DEBUG
+
         self.static_root = settings.STATIC_ROOT
         if self.static_root:
             self.add_files(self.static_root, prefix=self.static_prefix)
@@ -113,7 +247,16 @@ class WhiteNoiseMiddleware(WhiteNoise):
         if self.use_finders and not self.autorefresh:
             self.add_files_from_finders()
 
+        # Only started once all the files have been added, so that a reload
+        # can't see a partly configured instance
+        if reload_trigger_file is not None and not self.autorefresh:
+            self.reload_trigger = ReloadTrigger(
+                self, reload_trigger_file, self.RELOAD_CHECK_INTERVAL
+            )
+
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
         if self.autorefresh:
             static_file = self.find_file(request.path_info)
         else:
@@ -122,18 +265,84 @@ class WhiteNoiseMiddleware(WhiteNoise):
             return self.serve(static_file, request)
         return self.get_response(request)
 
-    @staticmethod
-    def serve(static_file, request):
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(
+                request.path_info
+            )
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await self.aserve(static_file, request)
+        return await self.get_response(request)
+
+    def serve(self, static_file, request):
+        metrics = self.metrics
+        if metrics is not None:
+            start = perf_counter()
         response = static_file.get_response(request.method, request.META)
-        status = int(response.status)
-        http_response = WhiteNoiseFileResponse(response.file or (), status=status)
-        # Remove default content-type
-        del http_response["content-type"]
-        for key, value in response.headers:
-            http_response[key] = value
+        http_response = self.get_http_response(
+            response, response.file or response.body or ()
+        )
+        if metrics is not None:
+            metrics.record(request.method, response, perf_counter() - start)
+        return http_response
+
+    async def aserve(self, static_file, request):
+        metrics = self.metrics
+        if metrics is not None:
+            start = perf_counter()
+        response = await sync_to_async(
+            static_file.get_response, thread_sensitive=False
+        )(request.method, request.META)
+        if response.file is not None:
+            content = AsyncFileIterator(response.file)
+        else:
+            content = aiter_body(response.body or ())
+        http_response = self.get_http_response(response, content)
+        if metrics is not None:
+            metrics.record(request.method, response, perf_counter() - start)
+        return http_response
+
+    @staticmethod
+    def get_http_response(response, content):
+        http_response = WhiteNoiseFileResponse(content, status=response.status)
+        # Replace the default headers (i.e. content-type) wholesale, rather
+        # than deleting them and setting each of ours in turn
+        http_response.headers = ResponseHeaders(response.headers)
         return http_response
 
+    def reload(self, full=False):
+        # The storage only reads its manifest once, so read any new one
+        # directly to recognise newly versioned files
+        if self.__dict__.get("hashed_names") is not None:
+            hashed_files, _ = staticfiles_storage.load_manifest()
+            self.hashed_names = self.get_hashed_names(hashed_files)
+        # Changes to the directories searched by the finders aren't tracked,
+        # so those files can only be found again by a full reload
+        super().reload(full=full or self.use_finders)
+
+    def reload_files(self, files):
+        super().reload_files(files)
+        if self.use_finders and not self.autorefresh:
+            self.update_files_from_finders(files)
+
     def add_files_from_finders(self):
+        with self.profile_startup("finders", self.static_prefix):
+            self.update_files_from_finders()
+
+    def update_files_from_finders(self, files=None):
+        found_files, stat_cache = self.scan_finders()
+        for url, path in found_files.items():
+            self.add_file_to_dictionary(url, path, stat_cache=stat_cache, files=files)
+        if self.digest_cache is not None:
+            self.digest_cache.save()
+
+    def scan_finders(self):
+        """
+        Return a dict mapping the URL of each file found by the staticfiles
+        finders to its path, and a dict mapping each path to its stat result
+        """
         files = {}
         for finder in finders.get_finders():
             for path, storage in finder.list(None):
@@ -149,8 +358,7 @@ class WhiteNoiseMiddleware(WhiteNoise):
                 # Use setdefault as only first matching file should be used
                 files.setdefault(url, storage.path(path))
         stat_cache = {path: os.stat(path) for path in files.values()}
-        for url, path in files.items():
-            self.add_file_to_dictionary(url, path, stat_cache=stat_cache)
+        return files, stat_cache
 
     def candidate_paths_for_url(self, url):
         if self.use_finders and url.startswith(self.static_prefix):
@@ -173,12 +381,33 @@ class WhiteNoiseMiddleware(WhiteNoise):
         name_without_hash = self.get_name_without_hash(name)
         if name == name_without_hash:
             return False
+        if self.use_manifest and self.hashed_names is not None:
+            return name in self.hashed_names
         static_url = self.get_static_url(name_without_hash)
         # If the static_url function maps the name without hash
         # back to the original name, then we know we've got a
         # versioned filename
         return bool(static_url and basename(static_url) == basename(url))
 
+    @cached_property
+    def hashed_names(self):
+        """
+        The set of versioned names listed in the staticfiles manifest, if the
+        storage keeps one (e.g. ManifestStaticFilesStorage), so files can be
+        checked against it rather than looking up each file's URL
+        """
+        return self.get_hashed_names(getattr(staticfiles_storage, "hashed_files", None))
+
+    @staticmethod
+    def get_hashed_names(hashed_files):
+        if not hashed_files:
+            return None
+        return frozenset(
+            hashed_name
+            for name, hashed_name in hashed_files.items()
+            if hashed_name != name
+        )
+
     def get_name_without_hash(self, filename):
         """
         Removes the version hash from a filename e.g, transforms
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import logging
+import threading
+from time import perf_counter
+
+from whitenoise.responders import LazyStaticFile, Redirect
+from whitenoise.runtime_compression import RuntimeCompressedFile
+
+logger = logging.getLogger("whitenoise")
+
+_missing = object()
+
+
+class StartupProfiler:
+    """
+    Times the phases of adding a directory of files, by temporarily
+    replacing the methods which make up each phase with timed wrappers.
+
+    Each phase is only charged for its own time, not that of any other
+    instrumented phase it calls, so the phase times add up to no more than
+    the total. When files are built on several threads the phase times are
+    summed across threads, so may add up to more than the elapsed time.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.replaced = []
+        self.active = True
+
+    def instrument(self, obj, name, phase):
+        # Skip optional hooks which aren't set or implemented
+        func = getattr(obj, name, None)
+        if func is None:
+            return
+        original = obj.__dict__.get(name, _missing)
+        self.replaced.append((obj, name, original))
+        setattr(obj, name, self.wrap(func, phase))
+
+    def restore(self):
+        self.active = False
+        for obj, name, original in reversed(self.replaced):
+            if original is _missing:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, original)
+        self.replaced = []
+
+    def wrap(self, func, phase):
+        def wrapper(*args, **kwargs):
+            # References to the wrapper may outlive profiling, e.g. when a
+            # method is stored by the objects it creates
+            if not self.active:
+                return func(*args, **kwargs)
+            try:
+                stack = self.local.stack
+            except AttributeError:
+                stack = self.local.stack = []
+            # Time spent in nested instrumented calls is added to the last
+            # item, to be subtracted from this phase's time
+            stack.append(0.0)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self.lock:
+                    self.seconds[phase] = self.seconds.get(phase, 0.0) + (
+                        elapsed - nested
+                    )
+
+        return wrapper
+
+    def get_report(self, source, prefix, seconds, responders):
+        """
+        Return a dict describing the files added and the time spent in each
+        phase
+        """
+        files = lazy_files = alternatives = redirects = 0
+        for responder in responders:
+            if isinstance(responder, Redirect):
+                redirects += 1
+                continue
+            files += 1
+            if isinstance(responder, LazyStaticFile):
+                lazy_files += 1
+                continue
+            if isinstance(responder, RuntimeCompressedFile):
+                responder = responder.static_file
+            # Don't count the uncompressed file itself
+            alternatives += len(responder.alternatives) - 1
+        phases = dict(self.seconds)
+        phases["other"] = max(seconds - sum(phases.values()), 0.0)
+        return {
+            "source": source,
+            "prefix": prefix,
+            "seconds": seconds,
+            "files": files,
+            "lazy_files": lazy_files,
+            "alternatives": alternatives,
+            "redirects": redirects,
+            "phases": phases,
+        }
+
+
+def log_startup_report(report):
+    phases = ", ".join(
+        f"{phase} {seconds:.3f}s" for phase, seconds in report["phases"].items()
+    )
+    logger.info(
+        "Added %d files (%d alternatives, %d redirects) from %s in %.3fs: %s",
+        report["files"],
+        report["alternatives"],
+        report["redirects"],
+        report["source"],
+        report["seconds"],
+        phases,
+    )
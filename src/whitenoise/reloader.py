@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import threading
+import warnings
+
+from whitenoise.watcher import get_mtime, register_after_fork
+
+
+class ReloadTrigger:
+    """
+    Calls `reload` on a WhiteNoise instance whenever the modification time of
+    the file at `path` changes, checking every `interval` seconds on a
+    background thread. Deployments can `touch` the file once all new files
+    are in place.
+    """
+
+    def __init__(self, whitenoise, path, interval):
+        self.whitenoise = whitenoise
+        self.path = path
+        self.interval = interval
+        self.mtime = get_mtime(path)
+        self.stopped = threading.Event()
+        self.thread = None
+        self.start()
+        # Threads don't survive fork(), so servers which load the application
+        # before starting their worker processes would otherwise leave the
+        # workers without one
+        register_after_fork(self.after_fork)
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.run, name="whitenoise-reload-trigger", daemon=True
+        )
+        self.thread.start()
+
+    def after_fork(self):
+        if not self.stopped.is_set():
+            # The parent's thread may have been using the event at the time
+            self.stopped = threading.Event()
+            self.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def check(self):
+        mtime = get_mtime(self.path)
+        if mtime == self.mtime:
+            return
+        self.mtime = mtime
+        # Removing the file doesn't trigger a reload
+        if mtime is None:
+            return
+        try:
+            self.whitenoise.reload()
+        except Exception as e:
+            # Keep serving the existing files, and try again next time the
+            # file is touched
+            warnings.warn(f"Unable to reload static files: {e!r}", stacklevel=2)
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 import errno
+import functools
+import io
 import os
 import re
+import secrets
 import stat
 from email.utils import formatdate, parsedate
 from http import HTTPStatus
@@ -13,20 +16,60 @@ from wsgiref.headers import Headers
 
 
 class Response:
-    __slots__ = ("status", "headers", "file")
+    __slots__ = ("status", "headers", "file", "body")
 
-    def __init__(self, status, headers, file):
+    def __init__(self, status, headers, file, body=None):
         self.status = status
         self.headers = headers
         self.file = file
+        # An iterable of bytes to send instead of `file` when the content is
+        # already held in memory
+        self.body = body
 
 
+# Suffixes of the precompressed variants of files, which aren't served at URLs
+# of their own when the uncompressed file exists
+COMPRESSED_SUFFIXES = (".gz", ".br", ".zst")
+
+# Precomputed WSGI status lines e.g. "200 OK"
+STATUS_LINES = {status: f"{status.value} {status.phrase}" for status in HTTPStatus}
+
 NOT_ALLOWED_RESPONSE = Response(
     status=HTTPStatus.METHOD_NOT_ALLOWED,
     headers=[("Allow", "GET, HEAD")],
     file=None,
 )
 
+# Headers whose values are usually the same for many files. Equal headers
+# are stored once, rather than once per file, to keep the files index small.
+# The shared values are never released, so only headers which can take just
+# a handful of different values belong here (not e.g. Last-Modified, which
+# would keep every mtime ever seen alive across reloads).
+SHARED_HEADER_NAMES = frozenset(
+    (
+        "Access-Control-Allow-Origin",
+        "Cache-Control",
+        "Content-Encoding",
+        "Content-Type",
+        "Vary",
+    )
+)
+
+_shared_values = {}
+
+
+def share(value):
+    """
+    Return a previously seen value equal to `value` if there is one, so that
+    equal values used by many files are only stored once
+    """
+    return _shared_values.setdefault(value, value)
+
+
+def share_headers(headers):
+    return [share(item) if item[0] in SHARED_HEADER_NAMES else item for item in headers]
+
+
 # Headers which should be returned with a 304 Not Modified response as
 # specified here: https://tools.ietf.org/html/rfc7232#section-4.1
 NOT_MODIFIED_HEADERS = (
@@ -46,10 +89,41 @@ class SlicedFile(BufferedIOBase):
     been reached.
     """
 
-    def __init__(self, fileobj, start, end):
+    def __init__(self, fileobj, start, end, size=None):
         fileobj.seek(start)
         self.fileobj = fileobj
-        self.remaining = end - start + 1
+        self.start = start
+        self.end = end
+        self.remaining = self.length = end - start + 1
+        self.reaches_end = size is not None and end == size - 1
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.end + 1 - self.remaining
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # Positions are those of the underlying file, as `socket.sendfile`
+        # seeks to just after the bytes it has sent from the descriptor
+        if whence == os.SEEK_CUR:
+            offset += self.tell()
+        elif whence == os.SEEK_END:
+            offset += self.end + 1
+        position = min(max(offset, self.start), self.end + 1)
+        self.fileobj.seek(position)
+        self.remaining = self.end + 1 - position
+        return position
+
+    def fileno(self):
+        # Servers which use `sendfile` start from the descriptor's current
+        # offset and may carry on to the end of the file, rather than stopping
+        # after Content-Length bytes. So we only hand over the descriptor when
+        # that's exactly the requested range, i.e. for the open-ended ranges
+        # used when seeking in audio and video.
+        if not self.reaches_end or self.remaining != self.length:
+            raise io.UnsupportedOperation("fileno")
+        return self.fileobj.fileno()
 
     def read(self, size=-1):
         if self.remaining <= 0:
@@ -67,84 +141,377 @@ class SlicedFile(BufferedIOBase):
         self.fileobj.close()
 
 
+class MultipartRangeFile(BufferedIOBase):
+    """
+    A file like wrapper which produces the body of a multipart/byteranges
+    response. `parts` is a list of bytes (the boundaries and part headers) and
+    (start, end) byte ranges which are read from `fileobj` as required.
+    """
+
+    def __init__(self, fileobj, parts):
+        self.fileobj = fileobj
+        self.parts = iter(parts)
+        # Either the unread remainder of a bytes part or the number of bytes
+        # remaining to be read from the file for a range part
+        self.current = None
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while not self.current:
+            part = next(self.parts, None)
+            if part is None:
+                return b""
+            if isinstance(part, bytes):
+                self.current = part
+            else:
+                start, end = part
+                self.fileobj.seek(start)
+                self.current = end - start + 1
+        if isinstance(self.current, bytes):
+            if size is None or size < 0:
+                size = len(self.current)
+            data = self.current[:size]
+            self.current = self.current[size:]
+            return data
+        if size is None or size < 0:
+            size = self.current
+        data = self.fileobj.read(min(size, self.current))
+        if not data:
+            raise OSError(f"Unexpected end of file: {self.fileobj}")
+        self.current -= len(data)
+        return data
+
+    def close(self):
+        super().close()
+        self.fileobj.close()
+
+
+class MappedFile(BufferedIOBase):
+    """
+    A file like wrapper which reads from a shared, read-only memory map of a
+    file. Closing it leaves the underlying map open for other responses, and
+    calls `release` if given.
+    """
+
+    def __init__(self, mapped, release=None):
+        self.mapped = mapped
+        self.release = release
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += len(self.mapped)
+        self.position = max(offset, 0)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def read(self, size=-1):
+        start = self.position
+        if size is None or size < 0:
+            end = len(self.mapped)
+        else:
+            end = min(start + size, len(self.mapped))
+        if start >= end:
+            return b""
+        self.position = end
+        return self.mapped[start:end]
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            if self.release is not None:
+                self.release()
+
+
+class PreadFile(BufferedIOBase):
+    """
+    A file like wrapper which reads from a file descriptor shared between
+    responses. Reads use `os.pread` so that concurrent responses don't disturb
+    each other's position, and `release` is called on close rather than
+    closing the descriptor.
+    """
+
+    def __init__(self, fd, size, release):
+        self.fd = fd
+        self.size = size
+        self.release = release
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self.position = max(offset, 0)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def fileno(self):
+        # The descriptor's own offset is never moved from zero, so it can be
+        # handed to servers which `sendfile` from the current offset, but only
+        # while that matches our position
+        if self.position != 0:
+            raise io.UnsupportedOperation("fileno")
+        return self.fd
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.position
+        if size <= 0:
+            return b""
+        data = os.pread(self.fd, size, self.position)
+        self.position += len(data)
+        return data
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self.release()
+
+
+# Matches each entity tag in an If-None-Match style list
+ETAG_RE = re.compile(r'(?:W/)?"[^"]*"')
+
+
+def parse_etags(header):
+    return ETAG_RE.findall(header)
+
+
+def strip_weak_prefix(etag):
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+# Maximum number of ranges in a single Range header which we'll honour
+MAX_RANGES = 64
+
+# Ranges separated by less than this many bytes are merged into one, as that's
+# cheaper to send than the extra part headers
+RANGE_COALESCE_GAP = 80
+
+
 class StaticFile:
-    def __init__(self, path, headers, encodings=None, stat_cache=None):
+    # Sites can have very many files, so these are kept as small as possible
+    __slots__ = (
+        "body_cache",
+        "fd_cache",
+        "mmap_cache",
+        "last_modified",
+        "etag",
+        "not_modified_response",
+        "alternatives",
+        "encodings",
+    )
+
+    def __init__(
+        self,
+        path,
+        headers,
+        encodings=None,
+        stat_cache=None,
+        body_cache=None,
+        mmap_cache=None,
+        fd_cache=None,
+    ):
+        self.body_cache = body_cache
+        self.fd_cache = fd_cache
+        self.mmap_cache = mmap_cache
         files = self.get_file_stats(path, encodings, stat_cache)
         headers = self.get_headers(headers, files)
         self.last_modified = parsedate(headers["Last-Modified"])
         self.etag = headers["ETag"]
         self.not_modified_response = self.get_not_modified_response(headers)
         self.alternatives = self.get_alternatives(headers, files)
+        self.encodings = share(tuple(encoding for encoding, _, _ in self.alternatives))
 
     def get_response(self, method, request_headers):
         if method not in ("GET", "HEAD"):
             return NOT_ALLOWED_RESPONSE
         if self.is_not_modified(request_headers):
             return self.not_modified_response
-        path, headers = self.get_path_and_headers(request_headers)
-        if method != "HEAD":
-            file_handle = open(path, "rb")  # noqa: SIM115
-        else:
-            file_handle = None
+        file_entry, response = self.get_alternative(request_headers)
         range_header = request_headers.get("HTTP_RANGE")
-        if range_header:
+        if range_header and self.is_range_valid(request_headers):
             try:
-                return self.get_range_response(range_header, headers, file_handle)
+                range_specs = self.parse_byte_ranges(range_header)
             except ValueError:
                 # If we can't interpret the Range request for any reason then
                 # just ignore it and return the standard response (this
                 # behaviour is allowed by the spec)
                 pass
-        return Response(HTTPStatus.OK, headers, file_handle)
+            else:
+                if len(range_specs) > 1:
+                    # Multiple ranges are always served from the unencoded
+                    # file, as a Content-Encoding header would apply to the
+                    # multipart body as a whole rather than to each part
+                    _, file_entry, response = self.alternatives[
+                        self.encodings.index(None)
+                    ]
+                ranges = self.get_byte_ranges(range_specs, file_entry.size)
+                return self.get_range_response(method, ranges, file_entry, response)
+        if method == "HEAD":
+            return response
+        file_handle, body = self.get_content(file_entry)
+        return Response(HTTPStatus.OK, response.headers, file_handle, body)
+
+    def get_content(self, file_entry):
+        """
+        Return a (file_handle, body) pair, exactly one of which is set,
+        providing the contents of the file
+        """
+        if self.body_cache is not None:
+            body = self.body_cache.get(file_entry)
+            if body is not None:
+                return None, [body]
+        return self.open_file(file_entry), None
+
+    def open_file(self, file_entry):
+        if self.mmap_cache is not None:
+            mapped_file = self.mmap_cache.open(file_entry)
+            if mapped_file is not None:
+                return mapped_file
+        if self.fd_cache is not None:
+            shared_file = self.fd_cache.open(file_entry)
+            if shared_file is not None:
+                return shared_file
+        return open(file_entry.path, "rb")  # noqa: SIM115
+
+    def get_range_response(self, method, ranges, file_entry, response):
+        size = file_entry.size
+        if not ranges:
+            return self.get_range_not_satisfiable_response(size)
+        if len(ranges) > 1:
+            return self.get_multipart_range_response(
+                method, ranges, file_entry, response
+            )
+        start, end = ranges[0]
+        headers = [item for item in response.headers if item[0] != "Content-Length"]
+        headers.append(("Content-Range", f"bytes {start}-{end}/{size}"))
+        headers.append(("Content-Length", str(end - start + 1)))
+        if method == "HEAD":
+            return Response(HTTPStatus.PARTIAL_CONTENT, headers, None)
+        file_handle, body = self.get_content(file_entry)
+        if file_handle is not None:
+            file_handle = SlicedFile(file_handle, start, end, size)
+        else:
+            body = [body[0][start : end + 1]]
+        return Response(HTTPStatus.PARTIAL_CONTENT, headers, file_handle, body)
 
-    def get_range_response(self, range_header, base_headers, file_handle):
+    def get_multipart_range_response(self, method, ranges, file_entry, response):
+        size = file_entry.size
+        boundary = secrets.token_hex(16)
         headers = []
-        for item in base_headers:
-            if item[0] == "Content-Length":
-                size = int(item[1])
-            else:
+        content_type = "application/octet-stream"
+        for item in response.headers:
+            if item[0] == "Content-Type":
+                content_type = item[1]
+            elif item[0] != "Content-Length":
                 headers.append(item)
-        start, end = self.get_byte_range(range_header, size)
-        if start >= end:
-            return self.get_range_not_satisfiable_response(file_handle, size)
+        parts = []
+        for start, end in ranges:
+            parts.append(
+                (
+                    f"--{boundary}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+                ).encode("latin-1")
+            )
+            parts.append((start, end))
+            parts.append(b"\r\n")
+        parts.append(f"--{boundary}--\r\n".encode("latin-1"))
+        content_length = sum(
+            len(part) if isinstance(part, bytes) else part[1] - part[0] + 1
+            for part in parts
+        )
+        headers.append(("Content-Type", f"multipart/byteranges; boundary={boundary}"))
+        headers.append(("Content-Length", str(content_length)))
+        if method == "HEAD":
+            return Response(HTTPStatus.PARTIAL_CONTENT, headers, None)
+        file_handle, body = self.get_content(file_entry)
         if file_handle is not None:
-            file_handle = SlicedFile(file_handle, start, end)
-        headers.append(("Content-Range", f"bytes {start}-{end}/{size}"))
-        headers.append(("Content-Length", str(end - start + 1)))
-        return Response(HTTPStatus.PARTIAL_CONTENT, headers, file_handle)
-
-    def get_byte_range(self, range_header, size):
-        start, end = self.parse_byte_range(range_header)
-        if start < 0:
-            start = max(start + size, 0)
-        if end is None:
-            end = size - 1
+            file_handle = MultipartRangeFile(file_handle, parts)
         else:
-            end = min(end, size - 1)
-        return start, end
+            data = body[0]
+            body = [
+                part if isinstance(part, bytes) else data[part[0] : part[1] + 1]
+                for part in parts
+            ]
+        return Response(HTTPStatus.PARTIAL_CONTENT, headers, file_handle, body)
+
+    @staticmethod
+    def get_byte_ranges(range_specs, size):
+        """
+        Return a sorted list of satisfiable (start, end) byte ranges, with any
+        overlapping or nearby ranges merged together
+        """
+        ranges = []
+        for start, end in range_specs:
+            if start < 0:
+                start = max(start + size, 0)
+                end = size - 1
+            elif end is None:
+                end = size - 1
+            else:
+                end = min(end, size - 1)
+            if start <= end:
+                ranges.append((start, end))
+        ranges.sort()
+        coalesced = []
+        for start, end in ranges:
+            if coalesced and start <= coalesced[-1][1] + RANGE_COALESCE_GAP:
+                coalesced[-1] = (coalesced[-1][0], max(end, coalesced[-1][1]))
+            else:
+                coalesced.append((start, end))
+        return coalesced
 
     @staticmethod
-    def parse_byte_range(range_header):
-        units, _, range_spec = range_header.strip().partition("=")
-        if units != "bytes":
+    def parse_byte_ranges(range_header):
+        units, _, range_set = range_header.strip().partition("=")
+        if units.strip().lower() != "bytes":
             raise ValueError()
-        # Only handle a single range spec. Multiple ranges will trigger a
-        # ValueError below which will result in the Range header being ignored
-        start_str, sep, end_str = range_spec.strip().partition("-")
-        if not sep:
+        range_specs = [spec.strip() for spec in range_set.split(",")]
+        range_specs = [spec for spec in range_specs if spec]
+        # Parsing and serving very many ranges is an easy way to make a server
+        # do lots of work for little benefit, so we ignore such requests
+        if not range_specs or len(range_specs) > MAX_RANGES:
             raise ValueError()
-        if not start_str:
-            start = -int(end_str)
-            end = None
-        else:
-            start = int(start_str)
-            end = int(end_str) if end_str else None
-        return start, end
+        ranges = []
+        for range_spec in range_specs:
+            start_str, sep, end_str = range_spec.partition("-")
+            if not sep:
+                raise ValueError()
+            if not start_str:
+                start = -int(end_str)
+                end = None
+            else:
+                start = int(start_str)
+                end = int(end_str) if end_str else None
+                if end is not None and end < start:
+                    raise ValueError()
+            ranges.append((start, end))
+        return ranges
 
     @staticmethod
-    def get_range_not_satisfiable_response(file_handle, size):
-        if file_handle is not None:
-            file_handle.close()
+    def get_range_not_satisfiable_response(size):
         return Response(
             HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
             [("Content-Range", f"bytes */{size}")],
@@ -183,17 +550,31 @@ class StaticFile:
 
     @staticmethod
     def get_not_modified_response(headers):
+        # Reuse the existing (name, value) pairs rather than creating new ones
+        items = {}
+        for item in headers.items():
+            items.setdefault(item[0].lower(), item)
         not_modified_headers = []
         for key in NOT_MODIFIED_HEADERS:
-            if key in headers:
-                not_modified_headers.append((key, headers[key]))
+            item = items.get(key.lower())
+            if item is not None:
+                not_modified_headers.append(item)
         return Response(
-            status=HTTPStatus.NOT_MODIFIED, headers=not_modified_headers, file=None
+            status=HTTPStatus.NOT_MODIFIED,
+            headers=share_headers(not_modified_headers),
+            file=None,
         )
 
     @staticmethod
     def get_alternatives(base_headers, files):
-        # Sort by size so that the smallest compressed alternative matches first
+        """
+        Return a tuple of (encoding, file_entry, response) tuples, one for
+        each available encoding of the file. The response has no file
+        attached, so it serves as-is for HEAD requests and as a template for
+        GET requests.
+        """
+        # Sort by size so that, all else being equal, the smallest compressed
+        # alternative is preferred
         alternatives = []
         files_by_size = sorted(files.items(), key=lambda i: i[1].size)
         for encoding, file_entry in files_by_size:
@@ -201,16 +582,26 @@ class StaticFile:
             headers["Content-Length"] = str(file_entry.size)
             if encoding:
                 headers["Content-Encoding"] = encoding
-                encoding_re = re.compile(rf"\b{encoding}\b")
-            else:
-                encoding_re = re.compile("")
-            alternatives.append((encoding_re, file_entry.path, headers.items()))
-        return alternatives
+            # WSGI requires the headers to be a list
+            response = Response(HTTPStatus.OK, share_headers(headers.items()), None)
+            alternatives.append((encoding, file_entry, response))
+        return tuple(alternatives)
 
     def is_not_modified(self, request_headers):
-        previous_etag = request_headers.get("HTTP_IF_NONE_MATCH")
-        if previous_etag is not None:
-            return previous_etag == self.etag
+        if_none_match = request_headers.get("HTTP_IF_NONE_MATCH")
+        if if_none_match is not None:
+            # Fast path for the common case of a single matching ETag
+            if if_none_match == self.etag:
+                return True
+            if if_none_match.strip() == "*":
+                return True
+            if self.etag is None:
+                return False
+            # If-None-Match uses the weak comparison function
+            etag = strip_weak_prefix(self.etag)
+            return any(
+                strip_weak_prefix(tag) == etag for tag in parse_etags(if_none_match)
+            )
         if self.last_modified is None:
             return False
         try:
@@ -222,19 +613,110 @@ class StaticFile:
             return last_requested_ts >= self.last_modified
         return False
 
-    def get_path_and_headers(self, request_headers):
-        accept_encoding = request_headers.get("HTTP_ACCEPT_ENCODING", "")
-        if accept_encoding == "*":
-            accept_encoding = ""
-        # These are sorted by size so first match is the best
-        for encoding_re, path, headers in self.alternatives:
-            if encoding_re.search(accept_encoding):
-                return path, headers
+    def is_range_valid(self, request_headers):
+        """
+        Check any If-Range precondition, which makes a Range header apply only
+        if the client's copy of the file is still current
+        """
+        if_range = request_headers.get("HTTP_IF_RANGE")
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith(('"', "W/")):
+            # If-Range uses the strong comparison function, so weak ETags
+            # never match
+            return (
+                self.etag is not None
+                and not self.etag.startswith("W/")
+                and if_range == self.etag
+            )
+        if self.last_modified is None:
+            return False
+        return parsedate(if_range) == self.last_modified
+
+    def get_alternative(self, request_headers):
+        if len(self.alternatives) == 1:
+            _, file_entry, response = self.alternatives[0]
+        else:
+            accept_encoding = request_headers.get("HTTP_ACCEPT_ENCODING", "")
+            index = choose_encoding(accept_encoding, self.encodings)
+            _, file_entry, response = self.alternatives[index]
+        return file_entry, response
+
+
+# Matches the "qvalue" grammar in https://www.rfc-editor.org/rfc/rfc9110#name-quality-values
+QVALUE_RE = re.compile(r"^(?:0(?:\.\d{0,3})?|1(?:\.0{0,3})?)$")
+
+# Codings which are equivalent to the ones we serve
+ENCODING_ALIASES = {"x-gzip": "gzip"}
+
+
+def parse_accept_encoding(accept_encoding):
+    """
+    Parse an Accept-Encoding header into a dict mapping each (lowercased)
+    content coding to its q-value. Malformed entries are ignored.
+    """
+    qvalues = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        coding = ENCODING_ALIASES.get(coding, coding)
+        qvalue = 1.0
+        for param in params.split(";") if params else ():
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                value = value.strip()
+                qvalue = float(value) if QVALUE_RE.match(value) else None
+        if qvalue is not None:
+            qvalues.setdefault(coding, qvalue)
+    return qvalues
+
+
+@functools.lru_cache(maxsize=512)
+def choose_encoding(accept_encoding, encodings):
+    """
+    Given the value of an Accept-Encoding header and a tuple of available
+    encodings (with None standing for the unencoded file) in order of
+    preference, return the index of the encoding to serve
+
+    Real traffic only has a handful of distinct Accept-Encoding values so
+    caching the result means this is mostly a single dict lookup.
+    """
+    qvalues = parse_accept_encoding(accept_encoding)
+    wildcard = qvalues.get("*")
+    best_index = None
+    best_qvalue = 0.0
+    for index, encoding in enumerate(encodings):
+        if encoding is None:
+            continue
+        # Only serve compressed content to clients which explicitly ask for
+        # it: a bare "*" doesn't select any particular coding
+        qvalue = qvalues.get(encoding, 0.0)
+        if qvalue > best_qvalue:
+            best_index = index
+            best_qvalue = qvalue
+    identity_index = encodings.index(None)
+    if "identity" in qvalues:
+        identity_qvalue = qvalues["identity"]
+    elif wildcard == 0.0:
+        identity_qvalue = 0.0
+    else:
+        # Acceptable, but only if no coding has been explicitly asked for
+        return identity_index if best_index is None else best_index
+    if identity_qvalue > best_qvalue:
+        return identity_index
+    # If nothing at all is acceptable we ignore the header and send the
+    # unencoded file, as permitted by the spec
+    return identity_index if best_index is None else best_index
 
 
 class Redirect:
+    __slots__ = ("response",)
+
     def __init__(self, location, headers=None):
-        headers = list(headers.items()) if headers else []
+        headers = share_headers(headers.items()) if headers else []
         headers.append(("Location", quote(location.encode("utf8"))))
         self.response = Response(HTTPStatus.FOUND, headers, None)
 
@@ -242,6 +724,30 @@ class Redirect:
         return self.response
 
 
+class LazyStaticFile:
+    """
+    Stands in for a `StaticFile` which is only built, by calling
+    `get_static_file(path, url)`, when it is first requested
+    """
+
+    __slots__ = ("get_static_file", "path", "url", "static_file")
+
+    def __init__(self, get_static_file, path, url):
+        self.get_static_file = get_static_file
+        self.path = path
+        self.url = url
+        self.static_file = None
+
+    def get_response(self, method, request_headers):
+        static_file = self.static_file
+        if static_file is None:
+            # Threads racing to build the same file each get an equivalent
+            # `StaticFile`, and assigning the attribute is atomic, so there's
+            # no need for a lock
+            static_file = self.static_file = self.get_static_file(self.path, self.url)
+        return static_file.get_response(method, request_headers)
+
+
 class NotARegularFileError(Exception):
     pass
 
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import warnings
+import weakref
+
+from whitenoise.compress import Compressor
+from whitenoise.responders import choose_encoding
+
+# Encodings produced at runtime, in the form expected by `choose_encoding`
+RUNTIME_ENCODINGS = ("br", "gzip", None)
+
+
+def remove_directory(directory, pid):
+    # Forked worker processes inherit the finalizer, but the directory is
+    # still in use by the process which created it and its other children
+    if os.getpid() == pid:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class CompressedFileStore:
+    """
+    Compresses files on demand and stores the results in `directory`, or in
+    a private temporary directory if none is given.
+
+    Results are named after a digest of the source file's path, size and
+    mtime, so a store directory shared between processes or kept across
+    restarts only ever compresses each version of a file once.
+    """
+
+    # Files smaller than this are unlikely to be worth compressing
+    min_size = 1024
+
+    def __init__(self, directory=None, extensions=None):
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix="whitenoise-")
+            self.remove_directory = weakref.finalize(
+                self, remove_directory, directory, os.getpid()
+            )
+        else:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.compressor = Compressor(extensions=extensions, quiet=True)
+
+    def should_compress(self, file_entry):
+        return file_entry.size >= self.min_size and self.compressor.should_compress(
+            file_entry.path
+        )
+
+    def compress(self, file_entry):
+        """
+        Return a dict mapping each encoding to the path of a compressed copy
+        of `file_entry`, which is empty if compression wasn't effective
+        """
+        key = f"{file_entry.path}\0{file_entry.size}\0{file_entry.mtime}"
+        name = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        paths = {
+            "br": os.path.join(self.directory, name + ".br"),
+            "gzip": os.path.join(self.directory, name + ".gz"),
+        }
+        if not self.compressor.use_brotli:
+            del paths["br"]
+        existing = {
+            encoding: path for encoding, path in paths.items() if os.path.isfile(path)
+        }
+        if existing:
+            return existing
+        with open(file_entry.path, "rb") as f:
+            data = f.read()
+        # The file has changed since its headers were built
+        if len(data) != file_entry.size:
+            return {}
+        encodings = {}
+        for encoding, path in paths.items():
+            if encoding == "br":
+                compressed = self.compressor.compress_brotli(data)
+            else:
+                compressed = self.compressor.compress_gzip(data)
+            if not self.compressor.is_compressed_effectively(
+                encoding, file_entry.path, len(data), compressed
+            ):
+                break
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+            encodings[encoding] = path
+        return encodings
+
+
+class RuntimeCompressedFile:
+    """
+    Wraps a `StaticFile` which has no precompressed alternatives. The first
+    time a client which accepts compression requests it, the file is
+    compressed and the wrapped `StaticFile` replaced by one which includes the
+    compressed alternatives. Concurrent requests wait for that rather than
+    compressing the file themselves.
+    """
+
+    __slots__ = ("static_file", "store", "create_static_file", "lock", "done")
+
+    def __init__(self, static_file, store, create_static_file):
+        self.static_file = static_file
+        self.store = store
+        self.create_static_file = create_static_file
+        self.lock = threading.Lock()
+        self.done = False
+
+    def get_response(self, method, request_headers):
+        if not self.done:
+            accept_encoding = request_headers.get("HTTP_ACCEPT_ENCODING", "")
+            if RUNTIME_ENCODINGS[choose_encoding(accept_encoding, RUNTIME_ENCODINGS)]:
+                self.compress()
+        return self.static_file.get_response(method, request_headers)
+
+    def compress(self):
+        with self.lock:
+            if self.done:
+                return
+            _, file_entry, response = self.static_file.alternatives[0]
+            try:
+                encodings = self.store.compress(file_entry)
+            except OSError as e:
+                # Carry on serving the uncompressed file
+                warnings.warn(
+                    f"Unable to compress {file_entry.path}: {e}", stacklevel=2
+                )
+                encodings = {}
+            if encodings:
+                # The existing headers already include Last-Modified and ETag,
+                # so these are unchanged
+                self.static_file = self.create_static_file(
+                    file_entry.path, response.headers, encodings
+                )
+            self.done = True
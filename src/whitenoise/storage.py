@@ -31,7 +31,10 @@ class CompressedStaticFilesStorage(StaticFilesStorage):
             return
 
         extensions = getattr(settings, "WHITENOISE_SKIP_COMPRESS_EXTENSIONS", None)
-        self.compressor = self.create_compressor(extensions=extensions, quiet=True)
+        use_zstd = getattr(settings, "WHITENOISE_USE_ZSTD", False)
+        self.compressor = self.create_compressor(
+            extensions=extensions, use_zstd=use_zstd, quiet=True
+        )
 
         def _compress_path(path: str) -> Generator[tuple[str, str, bool]]:
             compressed: list[tuple[str, str, bool]] = []
@@ -141,7 +144,10 @@ class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
 
     def compress_files(self, paths):
         extensions = getattr(settings, "WHITENOISE_SKIP_COMPRESS_EXTENSIONS", None)
-        self.compressor = self.create_compressor(extensions=extensions, quiet=True)
+        use_zstd = getattr(settings, "WHITENOISE_USE_ZSTD", False)
+        self.compressor = self.create_compressor(
+            extensions=extensions, use_zstd=use_zstd, quiet=True
+        )
 
         def _compress_path(path: str) -> list[tuple[str, str]]:
             compressed: list[tuple[str, str]] = []
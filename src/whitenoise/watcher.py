@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import os
+import threading
+import warnings
+import weakref
+
+from whitenoise.responders import COMPRESSED_SUFFIXES, NotARegularFileError
+
+
+class DirectoryWatcher:
+    """
+    Keeps a WhiteNoise instance's `files` dictionary up to date by polling
+    the directories it serves on a background thread, or only when `check`
+    is called if `interval` is None.
+
+    Each check costs one `stat` call per directory. Only directories whose
+    modification time has changed are listed again, and only the URLs of
+    files within them are rebuilt. Adding, removing or renaming a file
+    changes its directory's modification time, but modifying a file in place
+    does not, so deployments should replace files rather than rewrite them.
+    """
+
+    def __init__(self, whitenoise, interval):
+        self.whitenoise = whitenoise
+        self.interval = interval
+        self.roots = []
+        # Maps each watched directory to a (mtime, file names, subdirectory
+        # names) tuple describing its contents when last listed
+        self.listings = {}
+        # Re-entrant, as a full `reload` scans directories while holding it
+        self.lock = threading.RLock()
+        self.stopped = threading.Event()
+        self.thread = None
+        # Threads don't survive fork(), so servers which load the application
+        # before starting their worker processes would otherwise leave the
+        # workers without one
+        register_after_fork(self.after_fork)
+
+    def scan(self, root, stat_files=True):
+        """
+        List `root` and everything below it, returning a dict mapping the
+        path of each file to its stat result (or to None if `stat_files` is
+        False), so the files dictionary can be built from the same scan
+        """
+        stat_cache = {}
+        with self.lock:
+            self.add_listings(root, stat_cache, stat_files)
+        return stat_cache
+
+    def watch(self, root, prefix):
+        with self.lock:
+            self.roots.append((root, prefix))
+            # The root will already have been listed, unless its files were
+            # loaded from the index cache
+            if root not in self.listings:
+                self.add_listings(root)
+        if self.thread is None and self.interval is not None:
+            self.start()
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.run, name="whitenoise-watcher", daemon=True
+        )
+        self.thread.start()
+
+    def after_fork(self):
+        # The parent's threads may have been holding the lock or using the
+        # event at the time
+        self.lock = threading.RLock()
+        if self.thread is not None and not self.stopped.is_set():
+            self.stopped = threading.Event()
+            self.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """
+        Rebuild the entries for any files which have changed since the last
+        check
+        """
+        try:
+            with self.lock:
+                changed_paths = self.update(self.whitenoise.files)
+            digest_cache = self.whitenoise.digest_cache
+            if changed_paths and digest_cache is not None:
+                digest_cache.save()
+        except Exception as e:
+            # Keep serving the existing files, and keep the polling thread
+            # alive so later changes are still picked up
+            warnings.warn(
+                f"Unable to check for changed static files: {e!r}", stacklevel=2
+            )
+
+    def update(self, files):
+        """
+        Update the entries in `files` for any files which have changed since
+        the last check, returning their paths. The caller must hold `lock`.
+        """
+        changed_paths = []
+        for root, _ in self.roots:
+            self.check_directory(root, changed_paths)
+        for path in changed_paths:
+            for url in self.get_urls(path):
+                self.refresh_url(url, files)
+        return changed_paths
+
+    def check_directory(self, directory, changed_paths):
+        old_listing = self.listings.get(directory)
+        if old_listing is not None and old_listing[0] == get_mtime(directory):
+            for name in old_listing[2]:
+                self.check_directory(os.path.join(directory, name), changed_paths)
+            return
+        new_listing = self.list_directory(directory)
+        old_files, old_subdirs = old_listing[1:] if old_listing else ((), ())
+        new_files, new_subdirs = new_listing[1:]
+        for name in set(old_files) | set(new_files):
+            changed_paths.append(os.path.join(directory, name))
+        for name in set(old_subdirs) - set(new_subdirs):
+            changed_paths.extend(self.remove_listings(os.path.join(directory, name)))
+        for name in set(new_subdirs) - set(old_subdirs):
+            changed_paths.extend(self.add_listings(os.path.join(directory, name)))
+        for name in set(new_subdirs) & set(old_subdirs):
+            self.check_directory(os.path.join(directory, name), changed_paths)
+
+    def add_listings(self, directory, stat_cache=None, stat_files=True):
+        """
+        List `directory` and everything below it, returning the paths of all
+        files found
+        """
+        listing = self.list_directory(directory, stat_cache, stat_files)
+        paths = [os.path.join(directory, name) for name in listing[1]]
+        for name in listing[2]:
+            paths.extend(
+                self.add_listings(os.path.join(directory, name), stat_cache, stat_files)
+            )
+        return paths
+
+    def remove_listings(self, directory):
+        """
+        Forget `directory` and everything below it, returning the paths of all
+        files it previously contained
+        """
+        listing = self.listings.pop(directory, None)
+        if listing is None:
+            return []
+        paths = [os.path.join(directory, name) for name in listing[1]]
+        for name in listing[2]:
+            paths.extend(self.remove_listings(os.path.join(directory, name)))
+        return paths
+
+    def list_directory(self, directory, stat_cache=None, stat_files=True):
+        # Get the mtime first, so that any changes made while we're listing
+        # the directory are picked up by the next check
+        mtime = get_mtime(directory)
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        subdirs.append(entry.name)
+                    else:
+                        files.append(entry.name)
+                        if stat_cache is not None:
+                            stat_cache[entry.path] = (
+                                entry.stat() if stat_files else None
+                            )
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        listing = self.listings[directory] = (mtime, tuple(files), tuple(subdirs))
+        return listing
+
+    def get_urls(self, path):
+        """
+        Return the URLs whose responses may depend on the file at `path`
+        """
+        paths = [path]
+        if path.endswith(COMPRESSED_SUFFIXES):
+            # A compressed variant also affects the response for the
+            # uncompressed file
+            paths.append(os.path.splitext(path)[0])
+        index_file = self.whitenoise.index_file
+        urls = []
+        for path in paths:
+            for root, prefix in self.roots:
+                if not self.whitenoise.path_is_child_of(path, root):
+                    continue
+                url = prefix + path[len(root) :].replace("\\", "/")
+                urls.append(url)
+                if index_file is not None and url.endswith("/" + index_file):
+                    index_url = url[: -len(index_file)]
+                    urls.extend((index_url, index_url.rstrip("/")))
+        return urls
+
+    def refresh_url(self, url, files):
+        try:
+            static_file = self.whitenoise.find_file(url)
+        except NotARegularFileError:
+            static_file = None
+        if static_file is None:
+            files.pop(url, None)
+        else:
+            files[url] = static_file
+
+
+def register_after_fork(method):
+    """
+    Call the bound `method` in the child process after each fork, for as long
+    as its object is alive
+    """
+    if not hasattr(os, "register_at_fork"):
+        return
+    # Registered callbacks can't be removed, so hold only a weak reference
+    method_ref = weakref.WeakMethod(method)
+
+    def after_fork():
+        method = method_ref()
+        if method is not None:
+            method()
+
+    os.register_at_fork(after_in_child=after_fork)
+
+
+def get_mtime(directory):
+    try:
+        return os.stat(directory).st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        return None
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import asyncio
+import shutil
+import tempfile
+
+import pytest
+
+from tests.utils import Files
+from whitenoise.asgi import AsgiWhiteNoise
+
+
+@pytest.fixture(scope="module")
+def files():
+    return Files(
+        "assets",
+        js="subdir/javascript.js",
+        gzip="compressed.css",
+        gzipped="compressed.css.gz",
+        index="with-index/index.html",
+    )
+
+
+async def default_app(scope, receive, send):
+    assert scope["type"] == "http"
+    await send({"type": "http.response.start", "status": 404, "headers": []})
+    await send({"type": "http.response.body", "body": b"Not found"})
+
+
+@pytest.fixture(params=[True, False], scope="module")
+def application(request, files):
+    if request.param:
+        tmp = tempfile.mkdtemp()
+        shutil.rmtree(tmp)
+        shutil.copytree(files.directory, tmp)
+        yield AsgiWhiteNoise(default_app, root=tmp, index_file=True, autorefresh=True)
+        shutil.rmtree(tmp)
+    else:
+        yield AsgiWhiteNoise(default_app, root=files.directory, index_file=True)
+
+
+class AsgiResponse:
+    def __init__(self, messages):
+        start = messages[0]
+        assert start["type"] == "http.response.start"
+        self.status_code = start["status"]
+        self.headers = {
+            key.decode("latin-1").lower(): value.decode("latin-1")
+            for key, value in start["headers"]
+        }
+        self.content = b"".join(message.get("body", b"") for message in messages[1:])
+
+
+def request(application, path, method="GET", headers=None, root_path=""):
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": root_path + path,
+        "root_path": root_path,
+        "headers": [
+            (key.lower().encode("latin-1"), value.encode("latin-1"))
+            for key, value in (headers or {}).items()
+        ],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    return AsgiResponse(messages)
+
+
+def test_get_file(application, files):
+    response = request(application, "/" + files.js_path)
+    assert response.status_code == 200
+    assert response.content == files.js_content
+    assert response.headers["content-length"] == str(len(files.js_content))
+
+
+def test_get_file_under_root_path(application, files):
+    response = request(application, "/" + files.js_path, root_path="/subdir")
+    assert response.content == files.js_content
+
+
+def test_get_accept_gzip(application, files):
+    response = request(
+        application, "/" + files.gzip_path, headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.content == files.gzipped_content
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_not_modified(application, files):
+    response = request(application, "/" + files.js_path)
+    etag = response.headers["etag"]
+    response = request(
+        application, "/" + files.js_path, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_range_request(application, files):
+    response = request(
+        application, "/" + files.js_path, headers={"Range": "bytes=21-30"}
+    )
+    assert response.status_code == 206
+    assert response.content == files.js_content[21:31]
+
+
+def test_head_request_has_no_body(application, files):
+    response = request(application, "/" + files.js_path, method="HEAD")
+    assert response.status_code == 200
+    assert response.content == b""
+
+
+def test_index_file_redirect(application, files):
+    response = request(application, "/" + files.index_path)
+    assert response.status_code == 302
+    assert response.headers["location"] == "./"
+
+
+def test_other_requests_passed_through(application):
+    response = request(application, "/not/static")
+    assert response.status_code == 404
+    assert response.content == b"Not found"
+
+
+def test_non_http_scopes_passed_through(files):
+    scopes = []
+
+    async def app(scope, receive, send):
+        scopes.append(scope)
+
+    application = AsgiWhiteNoise(app, root=files.directory)
+    asyncio.run(application({"type": "lifespan"}, None, None))
+    assert scopes == [{"type": "lifespan"}]
+
+
+def test_streams_file_in_chunks(files):
+    application = AsgiWhiteNoise(default_app, root=files.directory)
+    application.block_size = 10
+    response = request(application, "/" + files.js_path)
+    assert response.content == files.js_content
+
+
+def test_memory_cache_body(files):
+    application = AsgiWhiteNoise(
+        default_app, root=files.directory, memory_cache_size=1024 * 1024
+    )
+    for _ in range(2):
+        response = request(application, "/" + files.js_path)
+        assert response.content == files.js_content
@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+
+from tests.utils import write_file
+from whitenoise.cache import (
+    BodyCache,
+    DigestCache,
+    FileDescriptorCache,
+    LookupCache,
+    MappedFileCache,
+    load_json_file,
+    save_json_file,
+)
+from whitenoise.responders import FileEntry
+
+
+def make_file(directory, name, content):
+    return FileEntry(write_file(directory, name, content))
+
+
+def test_body_cache_returns_file_contents(tmp_path):
+    entry = make_file(tmp_path, "a.txt", b"hello")
+    cache = BodyCache(max_size=100)
+    assert cache.get(entry) == b"hello"
+    assert cache.size == 5
+
+
+def test_body_cache_evicts_least_recently_used(tmp_path):
+    a = make_file(tmp_path, "a.txt", b"a" * 40)
+    b = make_file(tmp_path, "b.txt", b"b" * 40)
+    c = make_file(tmp_path, "c.txt", b"c" * 40)
+    cache = BodyCache(max_size=100)
+    cache.get(a)
+    cache.get(b)
+    # Touch `a` so that `b` becomes the least recently used entry
+    cache.get(a)
+    cache.get(c)
+    assert cache.size == 80
+    keys = [key[0] for key in cache.entries]
+    assert keys == [a.path, c.path]
+
+
+def test_body_cache_ignores_files_over_max_file_size(tmp_path):
+    entry = make_file(tmp_path, "a.txt", b"a" * 20)
+    cache = BodyCache(max_size=100, max_file_size=10)
+    assert cache.get(entry) is None
+    assert cache.size == 0
+
+
+def test_body_cache_ignores_files_changed_since_stat(tmp_path):
+    entry = make_file(tmp_path, "a.txt", b"short")
+    make_file(tmp_path, "a.txt", b"much longer")
+    cache = BodyCache(max_size=100)
+    assert cache.get(entry) is None
+    assert cache.size == 0
+
+
+def test_digest_cache_hashes_contents(tmp_path):
+    make_file(tmp_path, "a.txt", b"hello")
+    path = os.path.join(tmp_path, "a.txt")
+    cache = DigestCache()
+    expected = hashlib.blake2b(b"hello", digest_size=16).hexdigest()
+    assert cache.get_etag(path, os.stat(path)) == f'"{expected}"'
+
+
+def test_digest_cache_persists_digests(tmp_path):
+    make_file(tmp_path, "a.txt", b"hello")
+    path = os.path.join(tmp_path, "a.txt")
+    cache_path = os.path.join(tmp_path, "digests.json")
+    cache = DigestCache(cache_path)
+    digest = cache.get_digest(path, os.stat(path))
+    cache.save()
+    new_cache = DigestCache(cache_path)
+    with mock.patch.object(DigestCache, "hash_file") as hash_file:
+        assert new_cache.get_digest(path, os.stat(path)) == digest
+    hash_file.assert_not_called()
+    assert not new_cache.changed
+
+
+def test_digest_cache_rehashes_changed_files(tmp_path):
+    make_file(tmp_path, "a.txt", b"hello")
+    path = os.path.join(tmp_path, "a.txt")
+    cache_path = os.path.join(tmp_path, "digests.json")
+    cache = DigestCache(cache_path)
+    digest = cache.get_digest(path, os.stat(path))
+    cache.save()
+    make_file(tmp_path, "a.txt", b"goodbye")
+    new_cache = DigestCache(cache_path)
+    assert new_cache.get_digest(path, os.stat(path)) != digest
+
+
+def test_digest_cache_ignores_corrupt_file(tmp_path):
+    cache_path = os.path.join(tmp_path, "digests.json")
+    with open(cache_path, "w") as f:
+        f.write("{not json")
+    with pytest.warns(UserWarning, match="unreadable digest cache"):
+        cache = DigestCache(cache_path)
+    assert cache.digests == {}
+
+
+def test_json_file_round_trip(tmp_path):
+    path = os.path.join(tmp_path, "data.json")
+    assert load_json_file(path, "test cache") is None
+    save_json_file(path, {"version": 1}, "test cache")
+    assert load_json_file(path, "test cache") == {"version": 1}
+    assert os.listdir(tmp_path) == ["data.json"]
+
+
+def test_json_file_write_failure_warns(tmp_path):
+    path = os.path.join(tmp_path, "missing", "data.json")
+    with pytest.warns(UserWarning, match="Unable to write test cache"):
+        save_json_file(path, {"version": 1}, "test cache")
+
+
+def test_lookup_cache_remembers_results_until_expiry():
+    cache = LookupCache(ttl=10)
+    find_file = mock.Mock(side_effect=lambda url: None)
+    with mock.patch("whitenoise.cache.time.monotonic", return_value=100):
+        assert cache.get("/missing", find_file) is None
+        assert cache.get("/missing", find_file) is None
+    assert find_file.call_count == 1
+    with mock.patch("whitenoise.cache.time.monotonic", return_value=111):
+        cache.get("/missing", find_file)
+    assert find_file.call_count == 2
+
+
+def test_lookup_cache_evicts_oldest_entries():
+    cache = LookupCache(ttl=10, max_entries=2)
+    for url in ("/a", "/b", "/c"):
+        cache.get(url, str.upper)
+    assert list(cache.entries) == ["/b", "/c"]
+
+
+def test_lookup_cache_collapses_concurrent_lookups():
+    cache = LookupCache(ttl=10)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def find_file(url):
+        calls.append(url)
+        started.set()
+        release.wait()
+        return url
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        first = executor.submit(cache.get, "/a", find_file)
+        started.wait()
+        others = [executor.submit(cache.get, "/a", find_file) for _ in range(3)]
+        release.set()
+        results = [first.result()] + [future.result() for future in others]
+    assert results == ["/a"] * 4
+    assert calls == ["/a"]
+
+
+def test_lookup_cache_doesnt_remember_errors():
+    cache = LookupCache(ttl=10)
+    with pytest.raises(ValueError):
+        cache.get("/a", mock.Mock(side_effect=ValueError))
+    assert cache.get("/a", str.upper) == "/A"
+
+
+def test_fd_cache_shares_descriptors(tmp_path):
+    entry = make_file(tmp_path, "a.txt", b"hello world")
+    cache = FileDescriptorCache(max_entries=2)
+    try:
+        first = cache.open(entry)
+        second = cache.open(entry)
+        assert first.fd == second.fd
+        second.seek(6)
+        assert first.read() == b"hello world"
+        assert second.read() == b"world"
+        first.close()
+        second.close()
+        assert len(cache.entries) == 1
+    finally:
+        cache.clear()
+
+
+def test_fd_cache_closes_evicted_descriptors_once_released(tmp_path):
+    entries = [make_file(tmp_path, f"{name}.txt", b"x") for name in "abc"]
+    cache = FileDescriptorCache(max_entries=2)
+    in_use = cache.open(entries[0])
+    cache.open(entries[1]).close()
+    cache.open(entries[2]).close()
+    assert (entries[0].path, 1, entries[0].mtime) not in cache.entries
+    # Still readable by the response using it
+    assert in_use.read() == b"x"
+    in_use.close()
+    with pytest.raises(OSError):
+        os.fstat(in_use.fd)
+    cache.clear()
+
+
+def test_fd_cache_ignores_changed_files(tmp_path):
+    entry = make_file(tmp_path, "a.txt", b"hello")
+    with open(entry.path, "wb") as f:
+        f.write(b"goodbye")
+    cache = FileDescriptorCache(max_entries=2)
+    assert cache.open(entry) is None
+    assert not cache.entries
+
+
+def test_mmap_cache_shares_maps(tmp_path):
+    entry = make_file(tmp_path, "a.txt", b"hello world")
+    cache = MappedFileCache(max_entries=2, min_size=1)
+    try:
+        first = cache.open(entry)
+        second = cache.open(entry)
+        assert first.mapped is second.mapped
+        second.seek(6)
+        assert first.read() == b"hello world"
+        assert second.read() == b"world"
+        first.close()
+        second.close()
+        assert len(cache.entries) == 1
+    finally:
+        cache.clear()
+
+
+def test_mmap_cache_closes_evicted_maps_once_released(tmp_path):
+    entries = [make_file(tmp_path, f"{name}.txt", b"x") for name in "abc"]
+    cache = MappedFileCache(max_entries=2, min_size=1)
+    in_use = cache.open(entries[0])
+    cache.open(entries[1]).close()
+    cache.open(entries[2]).close()
+    assert len(cache.entries) == 2
+    # Still readable by the response using it
+    assert in_use.read() == b"x"
+    in_use.close()
+    assert in_use.mapped.closed
+    cache.clear()
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="Needs /proc")
+def test_mmap_cache_bounds_open_descriptors(tmp_path):
+    entries = [make_file(tmp_path, f"{index}.txt", b"x" * 10) for index in range(20)]
+    cache = MappedFileCache(max_entries=4, min_size=1)
+    fds_before = len(os.listdir("/proc/self/fd"))
+    for entry in entries:
+        cache.open(entry).close()
+    assert len(os.listdir("/proc/self/fd")) <= fds_before + 4
+    cache.clear()
+    assert len(os.listdir("/proc/self/fd")) <= fds_before
+
+
+def test_mmap_cache_ignores_small_and_changed_files(tmp_path):
+    entry = make_file(tmp_path, "a.txt", b"hello")
+    cache = MappedFileCache(max_entries=2, min_size=10)
+    assert cache.open(entry) is None
+    cache = MappedFileCache(max_entries=2, min_size=1)
+    with open(entry.path, "wb") as f:
+        f.write(b"goodbye")
+    assert cache.open(entry) is None
+    assert not cache.entries
@@ -95,3 +95,21 @@ def test_main_error(files_dir):
         compress_main([files_dir, "--quiet"])
 
     assert excinfo.value.args == ("woops",)
+
+
+def test_compress_zstd(files_dir):
+    path = os.path.join(files_dir, COMPRESSIBLE_FILE)
+    with (
+        mock.patch("whitenoise.compress.zstd_installed", True),
+        mock.patch.object(Compressor, "compress_zstd", return_value=b"zstd"),
+    ):
+        compressor = Compressor(use_brotli=False, use_zstd=True, quiet=True)
+        filenames = compressor.compress(path)
+    assert filenames == [path + ".zst", path + ".gz"]
+    with open(path + ".zst", "rb") as f:
+        assert f.read() == b"zstd"
+    os.unlink(path + ".zst")
+
+
+def test_zstd_not_used_by_default():
+    assert not Compressor(quiet=True).use_zstd
@@ -1,19 +1,27 @@
 from __future__ import annotations
 
+import asyncio
+import gzip
+import os
 import shutil
 import tempfile
 from contextlib import closing
+from unittest import mock
 from urllib.parse import urljoin, urlparse
 
 import pytest
+from asgiref.sync import iscoroutinefunction
 from django.conf import settings
 from django.contrib.staticfiles import finders, storage
 from django.core.management import call_command
 from django.core.wsgi import get_wsgi_application
+from django.http import HttpResponse
+from django.test import RequestFactory
 from django.test.utils import override_settings
 from django.utils.functional import empty
 
 from tests.utils import AppServer, Files
+from whitenoise.metrics import Metrics
 from whitenoise.middleware import WhiteNoiseFileResponse, WhiteNoiseMiddleware
 
 
@@ -215,3 +223,155 @@ def test_force_script_name(server, static_files, _collect_static):
     assert url.startswith("/subdir/static/")
     response = server.get(url)
     assert response.content == static_files.js_content
+
+
+async def async_get_response(request):
+    return HttpResponse("Not static", status=404)
+
+
+async def aread_streaming_content(response):
+    return b"".join([chunk async for chunk in response.streaming_content])
+
+
+def test_middleware_is_async_capable(_collect_static):
+    assert WhiteNoiseMiddleware.sync_capable
+    assert WhiteNoiseMiddleware.async_capable
+    assert iscoroutinefunction(WhiteNoiseMiddleware(async_get_response))
+    assert not iscoroutinefunction(WhiteNoiseMiddleware(lambda request: None))
+
+
+def test_async_get_file(static_files, _collect_static):
+    middleware = WhiteNoiseMiddleware(async_get_response)
+    url = storage.staticfiles_storage.url(static_files.js_path)
+    request = RequestFactory().get(url, HTTP_ACCEPT_ENCODING="gzip")
+    request.path_info = url[len(settings.FORCE_SCRIPT_NAME) :]
+
+    async def run():
+        response = await middleware(request)
+        assert response.is_async
+        return response, await aread_streaming_content(response)
+
+    response, content = asyncio.run(run())
+    assert response.status_code == 200
+    assert response["Content-Encoding"] == "gzip"
+    assert gzip.decompress(content) == static_files.js_content
+
+
+def test_async_head_request(static_files, _collect_static):
+    middleware = WhiteNoiseMiddleware(async_get_response)
+    url = settings.STATIC_URL + static_files.js_path
+    request = RequestFactory().head(url)
+    request.path_info = url[len(settings.FORCE_SCRIPT_NAME) :]
+
+    async def run():
+        response = await middleware(request)
+        return response, await aread_streaming_content(response)
+
+    response, content = asyncio.run(run())
+    assert response.status_code == 200
+    assert content == b""
+
+
+def test_async_miss_awaits_get_response(_collect_static):
+    middleware = WhiteNoiseMiddleware(async_get_response)
+    request = RequestFactory().get("/not/static")
+    response = asyncio.run(middleware(request))
+    assert response.status_code == 404
+    assert response.content == b"Not static"
+
+
+def test_metrics_setting(static_files, _collect_static):
+    metrics = Metrics()
+    with override_settings(WHITENOISE_METRICS=metrics):
+        middleware = WhiteNoiseMiddleware(lambda request: None)
+    url = settings.STATIC_URL + static_files.js_path
+    request = RequestFactory().get(url)
+    request.path_info = url[len(settings.FORCE_SCRIPT_NAME) :]
+    with closing(middleware(request)) as response:
+        assert response.status_code == 200
+    assert metrics.snapshot()["responses"] == {200: 1}
+
+
+def test_startup_report_setting(_collect_static):
+    reports = []
+    with override_settings(
+        WHITENOISE_STARTUP_REPORT=reports.append, WHITENOISE_USE_FINDERS=True
+    ):
+        middleware = WhiteNoiseMiddleware(lambda request: None)
+    assert [report["source"] for report in reports] == [
+        os.path.join(settings.STATIC_ROOT, ""),
+        os.path.join(settings.WHITENOISE_ROOT, ""),
+        "finders",
+    ]
+    assert reports[0]["prefix"] == middleware.static_prefix
+    assert reports[0]["files"] > 0
+    assert "immutable_file_test" in reports[0]["phases"]
+    assert "scan" in reports[2]["phases"]
+
+
+def test_immutable_files_found_from_manifest(static_files, _collect_static):
+    with mock.patch.object(
+        WhiteNoiseMiddleware, "get_static_url", side_effect=AssertionError
+    ):
+        middleware = WhiteNoiseMiddleware(lambda request: None)
+    hashed_url = storage.staticfiles_storage.url(static_files.js_path)
+    hashed_path = hashed_url[len(settings.FORCE_SCRIPT_NAME) :]
+    unhashed_path = middleware.static_prefix + static_files.js_path
+    assert middleware.immutable_file_test("", hashed_path)
+    assert not middleware.immutable_file_test("", unhashed_path)
+    # Names which only look hashed aren't immutable
+    assert not middleware.immutable_file_test("", middleware.static_prefix + "a.b.js")
+    response = middleware.files[hashed_path].get_response("HEAD", {})
+    assert (
+        "Cache-Control",
+        f"max-age={WhiteNoiseMiddleware.FOREVER}, public, immutable",
+    ) in response.headers
+
+
+def test_immutable_files_not_found_from_manifest_in_debug(
+    static_files, _collect_static
+):
+    hashed_url = storage.staticfiles_storage.url(static_files.js_path)
+    hashed_path = hashed_url[len(settings.FORCE_SCRIPT_NAME) :]
+    with override_settings(DEBUG=True):
+        middleware = WhiteNoiseMiddleware(lambda request: None)
+        assert not middleware.use_manifest
+        assert not middleware.immutable_file_test("", hashed_path)
+
+
+# Reloading does nothing in autorefresh mode
+@pytest.mark.parametrize("finder_static_files", [False], indirect=True)
+def test_reload_includes_finder_files(finder_static_files):
+    middleware = WhiteNoiseMiddleware(lambda request: None)
+    assert not middleware.autorefresh
+    url = settings.STATIC_URL[len(settings.FORCE_SCRIPT_NAME) :]
+    old_files = middleware.files
+    middleware.reload()
+    assert middleware.files is not old_files
+    assert list(middleware.files) == list(old_files)
+    assert url + finder_static_files.js_path in middleware.files
+
+
+def test_reload_reads_new_manifest(static_files, _collect_static):
+    middleware = WhiteNoiseMiddleware(lambda request: None)
+    new_path = middleware.static_prefix + "app.0123456789ab.js"
+    assert not middleware.immutable_file_test("", new_path)
+    hashed_files = {"app.js": "app.0123456789ab.js"}
+    with mock.patch.object(
+        storage.staticfiles_storage,
+        "load_manifest",
+        return_value=(hashed_files, "hash"),
+    ):
+        middleware.reload()
+    assert middleware.immutable_file_test("", new_path)
+
+
+@pytest.mark.parametrize("finder_static_files", [False], indirect=True)
+def test_incremental_reload_rescans_finder_files_in_full(finder_static_files):
+    with override_settings(WHITENOISE_INCREMENTAL_RELOAD=True):
+        middleware = WhiteNoiseMiddleware(lambda request: None)
+    assert not middleware.autorefresh
+    url = settings.STATIC_URL[len(settings.FORCE_SCRIPT_NAME) :]
+    old_file = middleware.files[url + finder_static_files.js_path]
+    middleware.reload()
+    assert middleware.files[url + finder_static_files.js_path] is not old_file
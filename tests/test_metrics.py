@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import gzip
+import threading
+
+import pytest
+
+from tests.utils import write_file
+from whitenoise import WhiteNoise
+from whitenoise.metrics import Metrics
+
+CONTENT = b"var x = 1;\n" * 64
+
+
+@pytest.fixture()
+def root(tmp_path):
+    root = str(tmp_path)
+    write_file(root, "app.js", CONTENT)
+    write_file(root, "app.js.gz", gzip.compress(CONTENT))
+    return root
+
+
+@pytest.fixture()
+def application(root):
+    return WhiteNoise(None, root=root, metrics=Metrics())
+
+
+def request(application, method="GET", **headers):
+    environ = {"PATH_INFO": "/app.js", "REQUEST_METHOD": method, **headers}
+    statuses = []
+    result = application(environ, lambda status, headers: statuses.append(status))
+    content = b"".join(result)
+    if hasattr(result, "close"):
+        result.close()
+    return statuses[0], content
+
+
+def test_responses_counted(application):
+    request(application)
+    _, gzipped = request(application, HTTP_ACCEPT_ENCODING="gzip")
+    request(application, "HEAD")
+    request(application, HTTP_RANGE="bytes=0-9")
+    etag = application.files["/app.js"].etag
+    request(application, HTTP_IF_NONE_MATCH=etag)
+
+    snapshot = application.metrics.snapshot()
+    assert snapshot["responses"] == {200: 3, 206: 1, 304: 1}
+    assert snapshot["encodings"] == {"identity": 3, "gzip": 1}
+    # HEAD responses have no body, so don't count towards the bytes sent
+    assert snapshot["bytes"] == {"identity": len(CONTENT) + 10, "gzip": len(gzipped)}
+    assert snapshot["latency"]["count"] == 5
+    assert snapshot["latency"]["buckets"][-1] == (float("inf"), 5)
+
+
+def test_counters_from_exited_threads_kept(application):
+    thread = threading.Thread(target=request, args=(application,))
+    thread.start()
+    thread.join()
+    request(application)
+    assert application.metrics.snapshot()["responses"] == {200: 2}
+    assert len(application.metrics.thread_counters) == 1
+    assert application.metrics.snapshot()["responses"] == {200: 2}
+
+
+def test_render_prometheus(application):
+    request(application)
+    request(application, "HEAD", HTTP_ACCEPT_ENCODING="gzip")
+    lines = application.metrics.render_prometheus().splitlines()
+    assert "# TYPE whitenoise_responses_total counter" in lines
+    assert 'whitenoise_responses_total{status="200"} 2' in lines
+    assert 'whitenoise_encoding_responses_total{encoding="gzip"} 1' in lines
+    assert 'whitenoise_encoding_responses_total{encoding="identity"} 1' in lines
+    assert f'whitenoise_response_bytes_total{{encoding="identity"}} {len(CONTENT)}' in (
+        lines
+    )
+    assert 'whitenoise_response_duration_seconds_bucket{le="+Inf"} 2' in lines
+    assert "whitenoise_response_duration_seconds_count 2" in lines
+
+
+def test_metrics_disabled_by_default(root):
+    application = WhiteNoise(None, root=root)
+    assert application.metrics is None
+    assert request(application)[1] == CONTENT
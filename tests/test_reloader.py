@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import os
+import shutil
+import time
+from unittest import mock
+
+import pytest
+
+from tests.utils import get_content, mark_changed, write_file
+from whitenoise import WhiteNoise
+from whitenoise.responders import Redirect
+from whitenoise.watcher import DirectoryWatcher
+
+
+@pytest.fixture()
+def root(tmp_path):
+    root = str(tmp_path / "static")
+    write_file(root, "app.js", b"var x = 1;")
+    return root
+
+
+def touch(path, offset=0):
+    # Move the mtime forwards explicitly, as filesystems may have coarse
+    # timestamps
+    mtime = time.time_ns() + offset * 10**9
+    with open(path, "a"):
+        pass
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_reload_swaps_in_new_files(root):
+    application = WhiteNoise(None, root=root, index_file=True)
+    old_files = application.files
+    old_file = old_files["/app.js"]
+    write_file(root, "app.js", b"var x = 2;")
+    write_file(root, "docs/index.html", b"<h1>Docs</h1>")
+    application.reload()
+    assert application.files is not old_files
+    assert get_content(application.files["/app.js"]) == b"var x = 2;"
+    assert get_content(application.files["/docs/"]) == b"<h1>Docs</h1>"
+    assert isinstance(application.files["/docs"], Redirect)
+    # Requests already being served keep the old objects
+    assert old_files["/app.js"] is old_file
+    assert "/docs/" not in old_files
+
+    os.unlink(os.path.join(root, "app.js"))
+    application.reload()
+    assert "/app.js" not in application.files
+
+
+def test_reload_keeps_precedence_of_later_roots(root, tmp_path):
+    override = str(tmp_path / "override")
+    write_file(override, "app.js", b"var x = 'override';")
+    application = WhiteNoise(None, root=root)
+    application.add_files(override)
+    application.reload()
+    assert get_content(application.files["/app.js"]) == b"var x = 'override';"
+
+
+def test_reload_updates_index_cache(root, tmp_path):
+    cache_path = str(tmp_path / "index.json")
+    application = WhiteNoise(None, root=root, index_cache_path=cache_path)
+    write_file(root, "new.js", b"var y = 1;")
+    application.reload()
+    files = application.index_cache.get_files(application, os.path.join(root, ""), "/")
+    assert "/new.js" in files
+
+
+@pytest.fixture()
+def incremental_application(root):
+    write_file(root, "css/site.css", b"body {}")
+    write_file(root, "docs/index.html", b"<h1>Docs</h1>")
+    return WhiteNoise(None, root=root, index_file=True, incremental_reload=True)
+
+
+def test_incremental_reload_rebuilds_only_changed_directories(
+    incremental_application, root
+):
+    application = incremental_application
+    old_files = application.files
+    css_file = old_files["/css/site.css"]
+    write_file(root, "new.js", b"var y = 1;")
+    application.reload()
+    assert application.files is not old_files
+    assert get_content(application.files["/new.js"]) == b"var y = 1;"
+    assert "/new.js" not in old_files
+    assert application.files["/css/site.css"] is css_file
+    assert application.files["/app.js"] is not old_files["/app.js"]
+
+
+def test_incremental_reload_removes_files_and_directories(
+    incremental_application, root
+):
+    application = incremental_application
+    os.unlink(os.path.join(root, "css", "site.css"))
+    mark_changed(os.path.join(root, "css"))
+    shutil.rmtree(os.path.join(root, "docs"))
+    mark_changed(root)
+    application.reload()
+    assert "/css/site.css" not in application.files
+    assert not any(url.startswith("/docs") for url in application.files)
+    assert "/app.js" in application.files
+
+
+def test_full_reload_rebuilds_unchanged_directories(incremental_application):
+    application = incremental_application
+    css_file = application.files["/css/site.css"]
+    application.reload(full=True)
+    assert application.files["/css/site.css"] is not css_file
+
+
+def test_directories_listed_once_when_tracked(root):
+    write_file(root, "css/site.css", b"body {}")
+    with mock.patch.object(
+        DirectoryWatcher,
+        "list_directory",
+        autospec=True,
+        side_effect=DirectoryWatcher.list_directory,
+    ) as list_directory_mock:
+        application = WhiteNoise(None, root=root, incremental_reload=True)
+    listed = sorted(call.args[1] for call in list_directory_mock.call_args_list)
+    assert listed == [os.path.join(root, ""), os.path.join(root, "css")]
+    assert application.watcher.thread is None
+    assert "/css/site.css" in application.files
+
+
+def test_reload_does_nothing_in_autorefresh_mode(root):
+    application = WhiteNoise(None, root=root, autorefresh=True)
+    application.reload()
+    assert application.files == {}
+
+
+@pytest.fixture()
+def trigger_file(root):
+    path = os.path.join(root, ".reload")
+    touch(path)
+    return path
+
+
+@pytest.fixture()
+def application(root, trigger_file):
+    application = WhiteNoise(None, root=root, reload_trigger_file=trigger_file)
+    yield application
+    application.reload_trigger.stop()
+
+
+def test_touching_trigger_file_reloads(application, root, trigger_file):
+    application.reload_trigger.check()
+    write_file(root, "new.js", b"var y = 1;")
+    application.reload_trigger.check()
+    assert "/new.js" not in application.files
+    touch(trigger_file, offset=10)
+    application.reload_trigger.check()
+    assert "/new.js" in application.files
+
+
+def test_removing_trigger_file_doesnt_reload(application, trigger_file):
+    os.unlink(trigger_file)
+    with mock.patch.object(application, "reload") as reload:
+        application.reload_trigger.check()
+    reload.assert_not_called()
+
+
+def test_failed_reload_warns(application, trigger_file):
+    touch(trigger_file, offset=10)
+    with (
+        mock.patch.object(application, "reload", side_effect=OSError("Oops")),
+        pytest.warns(UserWarning, match="Unable to reload static files"),
+    ):
+        application.reload_trigger.check()
+
+
+def test_trigger_checked_in_background(root, trigger_file):
+    class QuickWhiteNoise(WhiteNoise):
+        RELOAD_CHECK_INTERVAL = 0.01
+
+    application = QuickWhiteNoise(None, root=root, reload_trigger_file=trigger_file)
+    try:
+        write_file(root, "new.js", b"var y = 1;")
+        touch(trigger_file, offset=10)
+        deadline = time.monotonic() + 5
+        while "/new.js" not in application.files and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert "/new.js" in application.files
+    finally:
+        application.reload_trigger.stop()
+
+
+def test_trigger_thread_restarted_after_fork(application):
+    old_thread = application.reload_trigger.thread
+    application.reload_trigger.after_fork()
+    try:
+        assert application.reload_trigger.thread is not old_thread
+        assert application.reload_trigger.thread.is_alive()
+    finally:
+        application.reload_trigger.stop()
+        # The old thread checks the new event too, so it also stops
+        old_thread.join()
+
+
+def test_reload_lock_replaced_after_fork(root):
+    application = WhiteNoise(None, root=root)
+    # As if another thread in the parent was reloading when it forked
+    application.reload_lock.acquire()
+    application.after_fork()
+    assert not application.reload_lock.locked()
+    write_file(root, "new.js", b"var y = 2;")
+    application.reload()
+    assert "/new.js" in application.files
@@ -1,10 +1,20 @@
 from __future__ import annotations
 
+import io
+import os
 from io import BytesIO
 
+import pytest
 from django.test import SimpleTestCase
 
-from whitenoise.responders import SlicedFile
+from whitenoise.responders import (
+    MappedFile,
+    MultipartRangeFile,
+    PreadFile,
+    SlicedFile,
+    choose_encoding,
+    parse_accept_encoding,
+)
 
 
 class SlicedFileTests(SimpleTestCase):
@@ -40,3 +50,147 @@ class SlicedFileTests(SimpleTestCase):
         # Deleting the sliced file should not call close again.
         del sliced_file
         assert calls == 1
+
+    def test_fileno_exposed_for_ranges_to_end_of_file(self):
+        with open(__file__, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            sliced_file = SlicedFile(f, 10, size - 1, size)
+            assert sliced_file.fileno() == f.fileno()
+            # Servers using sendfile rely on the descriptor's offset
+            assert os.lseek(f.fileno(), 0, os.SEEK_CUR) == 10
+            sliced_file.read(1)
+            with pytest.raises(io.UnsupportedOperation):
+                sliced_file.fileno()
+
+    def test_fileno_not_exposed_for_ranges_within_file(self):
+        size = os.stat(__file__).st_size
+        for sliced_file in (
+            SlicedFile(open(__file__, "rb"), 10, size - 2, size),  # noqa: SIM115
+            SlicedFile(open(__file__, "rb"), 10, 20),  # noqa: SIM115
+        ):
+            with sliced_file, pytest.raises(io.UnsupportedOperation):
+                sliced_file.fileno()
+
+    def test_seek_uses_positions_in_underlying_file(self):
+        sliced_file = SlicedFile(BytesIO(b"0123456789"), 2, 7)
+        assert sliced_file.tell() == 2
+        assert sliced_file.read(2) == b"23"
+        assert sliced_file.tell() == 4
+        sliced_file.seek(6)
+        assert sliced_file.read() == b"67"
+        # Positions are kept within the range
+        assert sliced_file.seek(0) == 2
+        assert sliced_file.seek(1, os.SEEK_CUR) == 3
+        assert sliced_file.seek(100) == 8
+        assert sliced_file.read() == b""
+
+
+class MappedFileTests(SimpleTestCase):
+    def test_read_and_seek(self):
+        mapped_file = MappedFile(b"1234567890")
+        assert mapped_file.read(3) == b"123"
+        assert mapped_file.tell() == 3
+        mapped_file.seek(-2, os.SEEK_END)
+        assert mapped_file.read() == b"90"
+        assert mapped_file.read(1) == b""
+        mapped_file.seek(1)
+        mapped_file.seek(2, os.SEEK_CUR)
+        assert mapped_file.read(100) == b"4567890"
+
+    def test_close_leaves_map_open(self):
+        mapped = bytearray(b"1234567890")
+        mapped_file = MappedFile(mapped)
+        mapped_file.close()
+        assert mapped_file.closed
+        assert MappedFile(mapped).read() == b"1234567890"
+
+
+@pytest.mark.skipif(not hasattr(os, "pread"), reason="Requires os.pread")
+class PreadFileTests(SimpleTestCase):
+    def setUp(self):
+        self.path = __file__
+        self.fd = os.open(self.path, os.O_RDONLY)
+        self.addCleanup(os.close, self.fd)
+        with open(self.path, "rb") as f:
+            self.content = f.read()
+
+    def test_read_and_seek_leave_descriptor_offset_alone(self):
+        released = []
+        pread_file = PreadFile(self.fd, len(self.content), lambda: released.append(1))
+        assert pread_file.fileno() == self.fd
+        assert pread_file.read(10) == self.content[:10]
+        pread_file.seek(-5, os.SEEK_END)
+        assert pread_file.read() == self.content[-5:]
+        assert pread_file.read() == b""
+        assert os.lseek(self.fd, 0, os.SEEK_CUR) == 0
+        pread_file.close()
+        pread_file.close()
+        assert released == [1]
+
+    def test_fileno_unavailable_once_moved(self):
+        pread_file = PreadFile(self.fd, len(self.content), lambda: None)
+        pread_file.seek(1)
+        with pytest.raises(io.UnsupportedOperation):
+            pread_file.fileno()
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,expected",
+    [
+        ("", None),
+        ("*", None),
+        ("gzip", "gzip"),
+        ("GZIP", "gzip"),
+        ("x-gzip", "gzip"),
+        ("gzip, deflate, br", "br"),
+        ("gzip, deflate, br, zstd", "br"),
+        ("br;q=0, gzip", "gzip"),
+        ("br;q=0.5, gzip;q=0.8", "gzip"),
+        ("br; q=1.0, gzip;q=1", "br"),
+        ("gzip;q=0.5, identity", None),
+        ("gzip;q=0.5, identity;q=0.2", "gzip"),
+        ("br;q=0, gzip;q=0", None),
+        ("identity;q=0, *;q=0", None),
+        ("*;q=0, gzip", "gzip"),
+        ("br;q=2, gzip", "gzip"),
+        ("br;q=abc, gzip", "gzip"),
+        ("brotli, gzipped", None),
+    ],
+)
+def test_choose_encoding(accept_encoding, expected):
+    # Encodings are ordered by size, smallest first
+    encodings = ("br", "gzip", None)
+    index = choose_encoding(accept_encoding, encodings)
+    assert encodings[index] == expected
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip;q=0.5, br, identity;q=0, gzip") == {
+        "gzip": 0.5,
+        "br": 1.0,
+        "identity": 0.0,
+    }
+
+
+class MultipartRangeFileTests(SimpleTestCase):
+    def test_read_in_small_chunks(self):
+        parts = [b"--a\r\n", (1, 3), b"\r\n--a\r\n", (6, 7), b"\r\n--a--"]
+        multipart_file = MultipartRangeFile(BytesIO(b"1234567890"), parts)
+        chunks = []
+        while chunk := multipart_file.read(2):
+            assert len(chunk) <= 2
+            chunks.append(chunk)
+        assert b"".join(chunks) == b"--a\r\n234\r\n--a\r\n78\r\n--a--"
+
+    def test_read_all(self):
+        parts = [b"<", (0, 1), b">"]
+        multipart_file = MultipartRangeFile(BytesIO(b"1234567890"), parts)
+        assert multipart_file.read() == b"<"
+        assert multipart_file.read() == b"12"
+        assert multipart_file.read() == b">"
+        assert multipart_file.read() == b""
+
+    def test_close_closes_file(self):
+        file = BytesIO(b"1234567890")
+        MultipartRangeFile(file, []).close()
+        assert file.closed
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import gzip
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+
+from tests.utils import write_file
+from whitenoise import WhiteNoise
+from whitenoise.compress import Compressor
+from whitenoise.responders import StaticFile
+from whitenoise.runtime_compression import CompressedFileStore, RuntimeCompressedFile
+
+CONTENT = b"var x = 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa';\n" * 64
+
+
+@pytest.fixture()
+def root(tmp_path):
+    root = str(tmp_path / "static")
+    for name, content in (
+        ("app.js", CONTENT),
+        ("small.js", b"var x = 1;"),
+        ("image.jpg", CONTENT),
+        ("precompressed.js", CONTENT),
+        ("precompressed.js.gz", gzip.compress(CONTENT)),
+    ):
+        write_file(root, name, content)
+    return root
+
+
+@pytest.fixture()
+def store_dir(tmp_path):
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    return str(store_dir)
+
+
+def get_response(static_file, accept_encoding=None):
+    request_headers = {}
+    if accept_encoding is not None:
+        request_headers["HTTP_ACCEPT_ENCODING"] = accept_encoding
+    response = static_file.get_response("GET", request_headers)
+    with response.file as f:
+        return dict(response.headers), f.read()
+
+
+def test_only_compressible_files_wrapped(root):
+    application = WhiteNoise(None, root=root, runtime_compression=True)
+    assert isinstance(application.files["/app.js"], RuntimeCompressedFile)
+    assert isinstance(application.files["/small.js"], StaticFile)
+    assert isinstance(application.files["/image.jpg"], StaticFile)
+    assert isinstance(application.files["/precompressed.js"], StaticFile)
+
+
+def test_compressed_on_first_accepting_request(root, store_dir):
+    application = WhiteNoise(
+        None,
+        root=root,
+        runtime_compression=True,
+        runtime_compression_dir=store_dir,
+    )
+    static_file = application.files["/app.js"]
+    headers, content = get_response(static_file)
+    assert content == CONTENT
+    assert headers["Vary"] == "Accept-Encoding"
+    assert not static_file.done
+    assert not os.listdir(store_dir)
+
+    headers, content = get_response(static_file, "gzip")
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["Content-Length"] == str(len(content))
+    assert gzip.decompress(content) == CONTENT
+    assert headers["ETag"] == static_file.static_file.etag
+    headers, content = get_response(static_file)
+    assert content == CONTENT
+
+
+def test_store_reused_between_processes(root, store_dir):
+    def create_static_file():
+        application = WhiteNoise(
+            None,
+            root=root,
+            runtime_compression=True,
+            runtime_compression_dir=store_dir,
+        )
+        return application.files["/app.js"]
+
+    get_response(create_static_file(), "gzip")
+    with (
+        mock.patch.object(Compressor, "compress_gzip", side_effect=AssertionError),
+        mock.patch.object(Compressor, "compress_brotli", side_effect=AssertionError),
+    ):
+        headers, content = get_response(create_static_file(), "gzip")
+    assert gzip.decompress(content) == CONTENT
+
+
+def test_concurrent_requests_compress_once(root):
+    application = WhiteNoise(None, root=root, runtime_compression=True)
+    static_file = application.files["/app.js"]
+    store = static_file.store
+    original_compress = store.compress
+    calls = []
+
+    def compress(file_entry):
+        calls.append(file_entry.path)
+        # Give other requests time to arrive while we're compressing
+        time.sleep(0.05)
+        return original_compress(file_entry)
+
+    with (
+        mock.patch.object(store, "compress", side_effect=compress),
+        ThreadPoolExecutor(max_workers=4) as executor,
+    ):
+        results = list(
+            executor.map(lambda _: get_response(static_file, "gzip"), range(8))
+        )
+    assert len(calls) == 1
+    for headers, content in results:
+        assert headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(content) == CONTENT
+
+
+def test_ineffective_compression_not_retried(root):
+    application = WhiteNoise(None, root=root, runtime_compression=True)
+    static_file = application.files["/app.js"]
+    with mock.patch.object(Compressor, "is_compressed_effectively", return_value=False):
+        headers, content = get_response(static_file, "gzip")
+    assert "Content-Encoding" not in headers
+    assert static_file.done
+    assert len(static_file.static_file.alternatives) == 1
+
+
+def test_wrapper_restored_from_index_cache(root, store_dir):
+    cache_path = os.path.join(store_dir, "index.json")
+    for _ in range(2):
+        application = WhiteNoise(
+            None, root=root, runtime_compression=True, index_cache_path=cache_path
+        )
+        assert isinstance(application.files["/app.js"], RuntimeCompressedFile)
+
+
+def test_vary_header_not_repeated_after_index_cache_round_trip(root, store_dir):
+    cache_path = os.path.join(store_dir, "index.json")
+    WhiteNoise(None, root=root, runtime_compression=True, index_cache_path=cache_path)
+    application = WhiteNoise(
+        None, root=root, runtime_compression=True, index_cache_path=cache_path
+    )
+    static_file = application.files["/app.js"]
+    for accept_encoding in (None, "gzip"):
+        request_headers = {}
+        if accept_encoding is not None:
+            request_headers["HTTP_ACCEPT_ENCODING"] = accept_encoding
+        response = static_file.get_response("GET", request_headers)
+        response.file.close()
+        vary = [value for key, value in response.headers if key == "Vary"]
+        assert vary == ["Accept-Encoding"]
+
+
+def test_temporary_store_removed_only_by_creating_process():
+    store = CompressedFileStore()
+    try:
+        with mock.patch("os.getpid", return_value=os.getpid() + 1):
+            store.remove_directory()
+        assert os.path.isdir(store.directory)
+    finally:
+        shutil.rmtree(store.directory, ignore_errors=True)
+
+
+def test_temporary_store_removed():
+    store = CompressedFileStore()
+    store.remove_directory()
+    assert not os.path.exists(store.directory)
@@ -14,6 +14,7 @@ from django.test.utils import override_settings
 from django.utils.functional import empty
 
 from tests.utils import Files
+from whitenoise.compress import zstd_installed
 from whitenoise.storage import CompressedManifestStaticFilesStorage, MissingFileError
 
 
@@ -114,3 +115,34 @@ def test_manifest_strict_attribute_is_set():
     with override_settings(WHITENOISE_MANIFEST_STRICT=False):
         storage = CompressedManifestStaticFilesStorage()
         assert storage.manifest_strict is False
+
+
+@pytest.mark.skipif(not zstd_installed, reason="Zstandard not installed")
+@pytest.mark.parametrize(
+    "backend",
+    [
+        "whitenoise.storage.CompressedStaticFilesStorage",
+        "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    ],
+)
+def test_zstd_files_created_when_enabled(setup, backend):
+    storages = {
+        "STORAGES": {
+            **settings.STORAGES,
+            "staticfiles": {"BACKEND": backend},
+        }
+    }
+
+    with override_settings(**storages, WHITENOISE_USE_ZSTD=True):
+        call_command("collectstatic", verbosity=0, interactive=False)
+
+    names = os.listdir(settings.STATIC_ROOT)
+    assert any(name.endswith(".css.zst") for name in names)
+    assert any(name.endswith(".css.gz") for name in names)
+
+
+def test_zstd_files_not_created_by_default(_compressed_storage):
+    call_command("collectstatic", verbosity=0, interactive=False)
+
+    path = os.path.join(settings.STATIC_ROOT, "styles.css.zst")
+    assert not os.path.exists(path)
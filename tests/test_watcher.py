@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import gc
+import os
+import shutil
+import time
+import weakref
+from unittest import mock
+
+import pytest
+
+from tests.utils import get_content, mark_changed, write_file
+from whitenoise import WhiteNoise
+from whitenoise.responders import Redirect, StaticFile
+from whitenoise.watcher import register_after_fork
+
+
+@pytest.fixture()
+def root(tmp_path):
+    root = str(tmp_path / "static")
+    write_file(root, "app.js", b"var x = 1;")
+    write_file(root, "css/site.css", b"body {}")
+    return root
+
+
+@pytest.fixture()
+def application(root):
+    application = WhiteNoise(None, root=root, index_file=True, watch_interval=3600)
+    yield application
+    application.watcher.stop()
+
+
+def test_new_files_added(application, root):
+    write_file(root, "new.js", b"var y = 2;")
+    write_file(root, "css/new.css", b"p {}")
+    assert "/new.js" not in application.files
+    application.watcher.check()
+    assert get_content(application.files["/new.js"]) == b"var y = 2;"
+    assert get_content(application.files["/css/new.css"]) == b"p {}"
+
+
+def test_replaced_files_updated(application, root):
+    write_file(root, "css/site.css", b"body { color: red }")
+    application.watcher.check()
+    assert get_content(application.files["/css/site.css"]) == b"body { color: red }"
+
+
+def test_deleted_files_removed(application, root):
+    os.unlink(os.path.join(root, "app.js"))
+    mark_changed(root)
+    application.watcher.check()
+    assert "/app.js" not in application.files
+    assert "/css/site.css" in application.files
+
+
+def test_directories_added_and_removed(application, root):
+    os.makedirs(os.path.join(root, "docs", "guide"))
+    write_file(root, "docs/guide/index.html", b"<h1>Guide</h1>")
+    mark_changed(os.path.join(root, "docs"))
+    mark_changed(root)
+    application.watcher.check()
+    assert get_content(application.files["/docs/guide/"]) == b"<h1>Guide</h1>"
+    assert isinstance(application.files["/docs/guide"], Redirect)
+    assert isinstance(application.files["/docs/guide/index.html"], Redirect)
+
+    shutil.rmtree(os.path.join(root, "docs"))
+    mark_changed(root)
+    application.watcher.check()
+    assert not any(url.startswith("/docs") for url in application.files)
+
+
+def test_compressed_variants_picked_up(application, root):
+    write_file(root, "app.js.gz", b"not really gzip")
+    application.watcher.check()
+    assert "/app.js.gz" not in application.files
+    response = application.files["/app.js"].get_response(
+        "HEAD", {"HTTP_ACCEPT_ENCODING": "gzip"}
+    )
+    assert ("Content-Encoding", "gzip") in response.headers
+
+
+def test_later_roots_take_precedence(application, root, tmp_path):
+    override = str(tmp_path / "override")
+    write_file(override, "app.js", b"var x = 'override';")
+    application.add_files(override)
+    assert get_content(application.files["/app.js"]) == b"var x = 'override';"
+    write_file(root, "app.js", b"var x = 'changed';")
+    application.watcher.check()
+    assert get_content(application.files["/app.js"]) == b"var x = 'override';"
+
+
+def test_unchanged_files_not_rebuilt(application, root):
+    static_file = application.files["/css/site.css"]
+    write_file(root, "new.js", b"var y = 2;")
+    application.watcher.check()
+    assert application.files["/css/site.css"] is static_file
+
+
+def test_changes_picked_up_in_background(root):
+    application = WhiteNoise(None, root=root, watch_interval=0.01)
+    try:
+        write_file(root, "new.js", b"var y = 2;")
+        deadline = time.monotonic() + 5
+        while "/new.js" not in application.files and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert isinstance(application.files["/new.js"], StaticFile)
+    finally:
+        application.watcher.stop()
+
+
+def test_failed_check_warns(application, root):
+    write_file(root, "new.js", b"var y = 2;")
+    with (
+        mock.patch.object(application, "find_file", side_effect=OSError("oops")),
+        pytest.warns(UserWarning, match="Unable to check for changed static files"),
+    ):
+        application.watcher.check()
+    assert "/new.js" not in application.files
+
+
+def test_background_thread_survives_failed_check(root):
+    application = WhiteNoise(None, root=root, watch_interval=0.01)
+    try:
+        with (
+            mock.patch.object(application, "find_file", side_effect=OSError("oops")),
+            pytest.warns(
+                UserWarning, match="Unable to check for changed static files"
+            ) as record,
+        ):
+            write_file(root, "broken.js", b"var y = 2;")
+            deadline = time.monotonic() + 5
+            while not record and time.monotonic() < deadline:
+                time.sleep(0.01)
+        assert application.watcher.thread.is_alive()
+        write_file(root, "new.js", b"var z = 3;")
+        deadline = time.monotonic() + 5
+        while "/new.js" not in application.files and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert isinstance(application.files["/new.js"], StaticFile)
+    finally:
+        application.watcher.stop()
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "register_at_fork"), reason="os.register_at_fork unavailable"
+)
+def test_after_fork_hook_doesnt_keep_object_alive():
+    class Target:
+        calls = 0
+
+        def after_fork(self):
+            Target.calls += 1
+
+    target = Target()
+    with mock.patch("os.register_at_fork") as register_at_fork:
+        register_after_fork(target.after_fork)
+    hook = register_at_fork.call_args.kwargs["after_in_child"]
+    hook()
+    assert Target.calls == 1
+    target_ref = weakref.ref(target)
+    del target
+    gc.collect()
+    assert target_ref() is None
+    hook()
+    assert Target.calls == 1
+
+
+def test_watcher_thread_restarted_after_fork(root):
+    application = WhiteNoise(None, root=root, watch_interval=0.01)
+    watcher = application.watcher
+    old_thread = watcher.thread
+    old_lock = watcher.lock
+    watcher.after_fork()
+    try:
+        assert watcher.thread is not old_thread
+        assert watcher.thread.is_alive()
+        assert watcher.lock is not old_lock
+        write_file(root, "new.js", b"var y = 2;")
+        deadline = time.monotonic() + 5
+        while "/new.js" not in application.files and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert "/new.js" in application.files
+    finally:
+        watcher.stop()
+        # The old thread checks the new event too, so it also stops
+        old_thread.join()
+
+
+def test_watcher_thread_not_started_after_fork_when_stopped(application):
+    application.watcher.stop()
+    application.watcher.after_fork()
+    assert application.watcher.thread is None
+
+
+def test_watcher_not_used_in_autorefresh_mode(root):
+    application = WhiteNoise(None, root=root, autorefresh=True, watch_interval=1)
+    assert application.watcher is None
+
+
+def test_standalone_compressed_files_served(application, root):
+    write_file(root, "archive.tar.gz", b"not really gzip")
+    application.watcher.check()
+    assert get_content(application.files["/archive.tar.gz"]) == b"not really gzip"
@@ -1,22 +1,40 @@
 from __future__ import annotations
 
+import gc
+import io
+import logging
 import os
 import re
 import shutil
+import socket
 import stat
 import sys
 import tempfile
+import tracemalloc
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import closing
+from email.parser import BytesParser
+from http import HTTPStatus
 from urllib.parse import urljoin
+from wsgiref.handlers import SimpleHandler
 from wsgiref.headers import Headers
 from wsgiref.simple_server import demo_app
+from wsgiref.util import setup_testing_defaults
 
 import pytest
 
 from tests.utils import AppServer, Files
-from whitenoise import WhiteNoise
-from whitenoise.responders import StaticFile
+from whitenoise import WhiteNoise, responders
+from whitenoise.base import scantree, scantree_parallel
+from whitenoise.cache import BodyCache, MappedFileCache
+from whitenoise.responders import (
+    STATUS_LINES,
+    LazyStaticFile,
+    MappedFile,
+    Redirect,
+    StaticFile,
+)
 
 
 @pytest.fixture(scope="module")
@@ -113,6 +131,15 @@ def test_get_accept_gzip(server, files):
     assert response.headers["Vary"] == "Accept-Encoding"
 
 
+def test_get_gzip_refused_with_zero_qvalue(server, files):
+    response = server.get(
+        files.gzip_url, headers={"Accept-Encoding": "gzip;q=0, deflate"}
+    )
+    assert response.content == files.gzip_content
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+
 def test_cannot_directly_request_gzipped_file(server, files):
     response = server.get(files.gzip_url + ".gz")
     assert_is_default_response(response)
@@ -150,12 +177,109 @@ def test_etag_matches(server, files):
     assert response.status_code == 304
 
 
+def run_server_handler(application, method, url, **headers):
+    environ = {"REQUEST_METHOD": method, "PATH_INFO": url, **headers}
+    setup_testing_defaults(environ)
+    stdout = io.BytesIO()
+    handler = SimpleHandler(io.BytesIO(), stdout, io.StringIO(), environ)
+    handler.run(application)
+    head = stdout.getvalue().split(b"\r\n\r\n", 1)[0].decode()
+    status_line, *header_lines = head.split("\r\n")
+    return int(status_line.split()[1]), [line.split(": ", 1) for line in header_lines]
+
+
+def test_shared_headers_not_modified_by_server(files):
+    # wsgiref modifies the header list it's given in place, as may middleware
+    def add_header(environ, start_response):
+        def add_header_start_response(status, headers):
+            headers.append(("X-Frame-Options", "DENY"))
+            return start_response(status, headers)
+
+        return application(environ, add_header_start_response)
+
+    application = _init_application(files.directory)
+    url = "/" + files.js_path
+    status, headers = run_server_handler(add_header, "GET", url)
+    etag = dict(headers)["ETag"]
+    for _ in range(3):
+        status, headers = run_server_handler(
+            add_header, "GET", url, HTTP_IF_NONE_MATCH=etag
+        )
+        assert status == 304
+        status, headers = run_server_handler(add_header, "HEAD", url)
+        assert status == 200
+    status, headers = run_server_handler(add_header, "GET", url)
+    names = [name for name, _ in headers]
+    assert status == 200
+    assert names.count("X-Frame-Options") == 1
+    assert names.count("Content-Length") == 1
+
+
 def test_etag_doesnt_match(server, files):
     etag = '"594bd1d1-36"'
     response = server.get(files.js_url, headers={"If-None-Match": etag})
     assert response.status_code == 200
 
 
+def test_etag_list_matches(server, files):
+    etag = server.get(files.js_url).headers["ETag"]
+    if_none_match = f'"594bd1d1-36", {etag}, "other"'
+    response = server.get(files.js_url, headers={"If-None-Match": if_none_match})
+    assert response.status_code == 304
+
+
+def test_weak_etag_matches(server, files):
+    etag = server.get(files.js_url).headers["ETag"]
+    response = server.get(files.js_url, headers={"If-None-Match": f"W/{etag}"})
+    assert response.status_code == 304
+
+
+def test_etag_star_matches(server, files):
+    response = server.get(files.js_url, headers={"If-None-Match": "*"})
+    assert response.status_code == 304
+
+
+def test_if_range_etag_matches(server, files):
+    etag = server.get(files.js_url).headers["ETag"]
+    response = server.get(
+        files.js_url, headers={"Range": "bytes=0-13", "If-Range": etag}
+    )
+    assert response.status_code == 206
+    assert response.content == files.js_content[0:14]
+
+
+def test_if_range_etag_doesnt_match(server, files):
+    response = server.get(
+        files.js_url, headers={"Range": "bytes=0-13", "If-Range": '"594bd1d1-36"'}
+    )
+    assert response.status_code == 200
+    assert response.content == files.js_content
+
+
+def test_if_range_weak_etag_doesnt_match(server, files):
+    etag = server.get(files.js_url).headers["ETag"]
+    response = server.get(
+        files.js_url, headers={"Range": "bytes=0-13", "If-Range": f"W/{etag}"}
+    )
+    assert response.status_code == 200
+
+
+def test_if_range_date_matches(server, files):
+    last_mod = server.get(files.js_url).headers["Last-Modified"]
+    response = server.get(
+        files.js_url, headers={"Range": "bytes=0-13", "If-Range": last_mod}
+    )
+    assert response.status_code == 206
+
+
+def test_if_range_date_doesnt_match(server, files):
+    response = server.get(
+        files.js_url,
+        headers={"Range": "bytes=0-13", "If-Range": "Fri, 11 Apr 2001 11:47:06 GMT"},
+    )
+    assert response.status_code == 200
+
+
 def test_etag_overrules_modified_since(server, files):
     """
     Browsers send both headers so it's important that the ETag takes precedence
@@ -283,6 +407,70 @@ def test_out_of_range_error(server, files):
     assert response.headers["Content-Range"] == f"bytes */{len(files.js_content)}"
 
 
+def test_request_single_byte(server, files):
+    response = server.get(files.js_url, headers={"Range": "bytes=0-0"})
+    assert response.status_code == 206
+    assert response.content == files.js_content[:1]
+
+
+def test_invalid_range_ignored(server, files):
+    response = server.get(files.js_url, headers={"Range": "bytes=20-10"})
+    assert response.status_code == 200
+    assert response.content == files.js_content
+
+
+def parse_multipart_byteranges(response):
+    message = BytesParser().parsebytes(
+        f"Content-Type: {response.headers['Content-Type']}\r\n\r\n".encode()
+        + response.content
+    )
+    return [
+        (part["Content-Range"], part.get_payload(decode=True))
+        for part in message.get_payload()
+    ]
+
+
+def test_request_multiple_ranges(server, files):
+    # Multiple ranges are always served from the unencoded file
+    response = server.get(
+        files.gzip_url,
+        headers={"Range": "bytes=200-209, 0-3", "Accept-Encoding": "gzip"},
+    )
+    size = len(files.gzip_content)
+    assert response.status_code == 206
+    assert response.headers["Content-Type"].startswith("multipart/byteranges;")
+    assert "Content-Encoding" not in response.headers
+    assert int(response.headers["Content-Length"]) == len(response.content)
+    assert parse_multipart_byteranges(response) == [
+        (f"bytes 0-3/{size}", files.gzip_content[0:4]),
+        (f"bytes 200-209/{size}", files.gzip_content[200:210]),
+    ]
+
+
+def test_overlapping_ranges_coalesced(server, files):
+    response = server.get(
+        files.gzip_url,
+        headers={"Range": "bytes=0-3, 2-8, 30-40", "Accept-Encoding": ""},
+    )
+    size = len(files.gzip_content)
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 0-40/{size}"
+    assert response.content == files.gzip_content[0:41]
+
+
+def test_unsatisfiable_ranges_dropped(server, files):
+    response = server.get(files.js_url, headers={"Range": "bytes=0-3, 10000-"})
+    assert response.status_code == 206
+    assert response.content == files.js_content[0:4]
+
+
+def test_too_many_ranges_ignored(server, files):
+    ranges = ", ".join(f"{i * 100}-{i * 100}" for i in range(100))
+    response = server.get(files.js_url, headers={"Range": f"bytes={ranges}"})
+    assert response.status_code == 200
+    assert response.content == files.js_content
+
+
 def test_warn_about_missing_directories(application):
     # This is the one minor behavioural difference when autorefresh is
     # enabled: we don't warn about missing directories as these can be
@@ -399,3 +587,460 @@ def test_path_is_child_of(root, path, expected):
     root = root.replace("/", os.path.sep)
     path = path.replace("/", os.path.sep)
     assert WhiteNoise.path_is_child_of(path, root) == expected
+
+
+def test_memory_cache_serves_small_files_from_memory():
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "small.txt")
+        with open(path, "wb") as f:
+            f.write(b"0123456789")
+        stat_cache = {path: os.stat(path)}
+        body_cache = BodyCache(max_size=1024)
+        responder = StaticFile(path, [], stat_cache=stat_cache, body_cache=body_cache)
+        assert responder.get_response("GET", {}).body == [b"0123456789"]
+        # Once cached the file on disk is no longer needed
+        os.unlink(path)
+        response = responder.get_response("GET", {})
+        assert response.file is None
+        assert response.body == [b"0123456789"]
+        response = responder.get_response("GET", {"HTTP_RANGE": "bytes=2-4"})
+        assert response.status == 206
+        assert response.body == [b"234"]
+        response = responder.get_response("HEAD", {})
+        assert response.body is None
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_memory_cache_skips_large_files():
+    body_cache = BodyCache(max_size=1024, max_file_size=10)
+    stat_cache = {__file__: os.stat(__file__)}
+    responder = StaticFile(__file__, [], stat_cache=stat_cache, body_cache=body_cache)
+    response = responder.get_response("GET", {})
+    assert response.body is None
+    response.file.close()
+    assert body_cache.size == 0
+
+
+def test_memory_cache_application(files):
+    application = WhiteNoise(
+        demo_app, root=files.directory, memory_cache_size=1024 * 1024
+    )
+    with closing(AppServer(application)) as server:
+        for _ in range(2):
+            response = server.get(files.gzip_url)
+            assert response.content == files.gzip_content
+            assert response.headers["Content-Encoding"] == "gzip"
+            assert int(response.headers["Content-Length"]) == len(files.gzipped_content)
+
+
+def test_mmap_serves_full_and_partial_responses():
+    with open(__file__, "rb") as f:
+        content = f.read()
+    stat_cache = {__file__: os.stat(__file__)}
+    mmap_cache = MappedFileCache(max_entries=4, min_size=1)
+    responder = StaticFile(__file__, [], stat_cache=stat_cache, mmap_cache=mmap_cache)
+    response = responder.get_response("GET", {})
+    assert isinstance(response.file, MappedFile)
+    assert response.file.read() == content
+    response.file.close()
+    response = responder.get_response("GET", {"HTTP_RANGE": "bytes=10-19"})
+    assert response.file.read(4) == content[10:14]
+    assert response.file.read() == content[14:20]
+    response.file.close()
+    # All responses share a single map of the file
+    assert len(mmap_cache.entries) == 1
+    mmap_cache.clear()
+
+
+def test_mmap_not_used_below_min_size():
+    stat_cache = {__file__: os.stat(__file__)}
+    mmap_cache = MappedFileCache(max_entries=4, min_size=10**9)
+    responder = StaticFile(__file__, [], stat_cache=stat_cache, mmap_cache=mmap_cache)
+    response = responder.get_response("GET", {})
+    assert not isinstance(response.file, MappedFile)
+    response.file.close()
+
+
+def test_mmap_application(files):
+    application = WhiteNoise(demo_app, root=files.directory, mmap_min_size=1)
+    with closing(AppServer(application)) as server:
+        response = server.get(files.js_url)
+        assert response.content == files.js_content
+        response = server.get(files.js_url, headers={"Range": "bytes=21-30"})
+        assert response.content == files.js_content[21:31]
+
+
+def test_head_responses_are_prebuilt():
+    stat_cache = {__file__: fake_stat_entry()}
+    responder = StaticFile(__file__, [], stat_cache=stat_cache)
+    response = responder.get_response("HEAD", {})
+    assert response.file is None
+    assert responder.get_response("HEAD", {}) is response
+    get_response = responder.get_response("GET", {})
+    get_response.file.close()
+    assert get_response.headers is response.headers
+
+
+def test_status_lines():
+    assert STATUS_LINES[HTTPStatus.OK] == "200 OK"
+    assert STATUS_LINES[HTTPStatus.PARTIAL_CONTENT] == "206 Partial Content"
+    assert STATUS_LINES[HTTPStatus.NOT_MODIFIED] == "304 Not Modified"
+
+
+def test_multiple_ranges_from_memory_cache():
+    body_cache = BodyCache(max_size=1024 * 1024, max_file_size=1024 * 1024)
+    stat_cache = {__file__: os.stat(__file__)}
+    responder = StaticFile(__file__, [], stat_cache=stat_cache, body_cache=body_cache)
+    with open(__file__, "rb") as f:
+        content = f.read()
+    response = responder.get_response("GET", {"HTTP_RANGE": "bytes=0-9, 500-509"})
+    assert response.file is None
+    body = b"".join(response.body)
+    assert content[0:10] in body
+    assert content[500:510] in body
+    head_response = responder.get_response("HEAD", {"HTTP_RANGE": "bytes=0-9, 500-509"})
+    assert head_response.file is None
+    assert head_response.body is None
+    assert dict(head_response.headers)["Content-Length"] == str(len(body))
+
+
+def test_content_etags_survive_mtime_changes():
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "app.js")
+        with open(path, "wb") as f:
+            f.write(b"var x = 1;")
+        cache_path = os.path.join(tmp, "digests.json")
+        application = WhiteNoise(
+            None, root=tmp, content_etags=True, digest_cache_path=cache_path
+        )
+        etag = application.files["/app.js"].etag
+        assert os.path.exists(cache_path)
+        # Simulate a deploy which rewrites identical content
+        os.utime(path, (1498579535, 1498579535))
+        application = WhiteNoise(None, root=tmp, content_etags=True)
+        assert application.files["/app.js"].etag == etag
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_index_cache_loaded_without_scanning(files, monkeypatch):
+    tmp = tempfile.mkdtemp()
+    try:
+        root = os.path.join(tmp, "static")
+        copytree(files.directory, root)
+        cache_path = os.path.join(tmp, "index.json")
+        application = _init_application(root, index_cache_path=cache_path)
+        assert os.path.exists(cache_path)
+
+        def fail_scantree(root):
+            raise AssertionError("Directory should not be scanned")
+
+        monkeypatch.setattr("whitenoise.base.scantree", fail_scantree)
+        cached = _init_application(root, index_cache_path=cache_path)
+        assert cached.files.keys() == application.files.keys()
+        for url, responder in application.files.items():
+            cached_responder = cached.files[url]
+            for request_headers in ({}, {"HTTP_ACCEPT_ENCODING": "gzip"}):
+                response = responder.get_response("HEAD", request_headers)
+                cached_response = cached_responder.get_response("HEAD", request_headers)
+                assert cached_response.status == response.status
+                assert sorted(cached_response.headers) == sorted(response.headers)
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_index_cache_rebuilt_when_stale():
+    tmp = tempfile.mkdtemp()
+    try:
+        root = os.path.join(tmp, "static")
+        os.mkdir(root)
+        with open(os.path.join(root, "app.js"), "wb") as f:
+            f.write(b"var x = 1;")
+        cache_path = os.path.join(tmp, "index.json")
+        WhiteNoise(None, root=root, index_cache_path=cache_path)
+        with open(os.path.join(root, "new.js"), "wb") as f:
+            f.write(b"var y = 2;")
+        # Make sure the directory mtime changes even on coarse filesystems
+        os.utime(root, ns=(0, 0))
+        application = WhiteNoise(None, root=root, index_cache_path=cache_path)
+        assert "/new.js" in application.files
+        # A change of configuration also invalidates the index
+        application = WhiteNoise(
+            None, root=root, max_age=1, index_cache_path=cache_path
+        )
+        response = application.files["/new.js"].get_response("GET", {})
+        response.file.close()
+        assert ("Cache-Control", "max-age=1, public") in response.headers
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_index_cache_rebuilt_when_subdirectory_changes():
+    tmp = tempfile.mkdtemp()
+    try:
+        root = os.path.join(tmp, "static")
+        css_dir = os.path.join(root, "css")
+        os.makedirs(css_dir)
+        path = os.path.join(css_dir, "site.css")
+        with open(path, "wb") as f:
+            f.write(b"body {}")
+        cache_path = os.path.join(tmp, "index.json")
+        WhiteNoise(None, root=root, index_cache_path=cache_path)
+        # Replace a file and add another, as collectstatic does
+        os.unlink(path)
+        with open(path, "wb") as f:
+            f.write(b"body { color: red }")
+        with open(os.path.join(css_dir, "new.css"), "wb") as f:
+            f.write(b"p {}")
+        # Make sure the directory mtime changes even on coarse filesystems
+        os.utime(css_dir, ns=(0, 0))
+        application = WhiteNoise(None, root=root, index_cache_path=cache_path)
+        assert "/css/new.css" in application.files
+        response = application.files["/css/site.css"].get_response("GET", {})
+        with response.file as f:
+            content = f.read()
+        assert content == b"body { color: red }"
+        assert ("Content-Length", str(len(content))) in response.headers
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_lazy_index_builds_files_on_first_request(files):
+    application = _init_application(files.directory, lazy_index=True)
+    lazy_file = application.files["/" + files.js_path]
+    assert isinstance(lazy_file, LazyStaticFile)
+    assert lazy_file.static_file is None
+    assert "/" + files.gzipped_path not in application.files
+    app_server = AppServer(application)
+    with closing(app_server):
+        response = app_server.get(files.gzip_url)
+        assert response.content == files.gzip_content
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["X-Is-Css-File"] == "True"
+        response = app_server.get(f"/{AppServer.PREFIX}/with-index/")
+        assert response.content == files.index_content
+    assert lazy_file.static_file is None
+    assert isinstance(application.files["/" + files.gzip_path].static_file, StaticFile)
+
+
+def test_scantree_parallel_matches_scantree(files):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(scantree_parallel(files.directory, executor))
+        paths = [
+            path for path, _ in scantree_parallel(files.directory, executor, False)
+        ]
+    expected = list(scantree(files.directory))
+    assert [path for path, _ in results] == [path for path, _ in expected]
+    assert [result.st_size for _, result in results] == [
+        result.st_size for _, result in expected
+    ]
+    assert paths == [path for path, _ in expected]
+
+
+@pytest.mark.parametrize("lazy_index", [False, True])
+def test_scan_workers_builds_same_files(files, lazy_index):
+    application = _init_application(files.directory, lazy_index=lazy_index)
+    parallel = _init_application(files.directory, lazy_index=lazy_index, scan_workers=4)
+    assert list(parallel.files) == list(application.files)
+    for url, responder in application.files.items():
+        assert type(parallel.files[url]) is type(responder)
+        response = responder.get_response("HEAD", {})
+        parallel_response = parallel.files[url].get_response("HEAD", {})
+        assert parallel_response.headers == response.headers
+
+
+def test_autorefresh_ttl_caches_lookups():
+    tmp = tempfile.mkdtemp()
+    try:
+        application = WhiteNoise(None, root=tmp, autorefresh=True, autorefresh_ttl=3600)
+        assert application.find_file("/app.js") is None
+        with open(os.path.join(tmp, "app.js"), "wb") as f:
+            f.write(b"var x = 1;")
+        assert application.find_file("/app.js") is None
+        application.lookup_cache.clear()
+        assert isinstance(application.find_file("/app.js"), StaticFile)
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_fd_cache_application(files):
+    application = WhiteNoise(demo_app, root=files.directory, fd_cache_size=4)
+    try:
+        with closing(AppServer(application)) as server:
+            for _ in range(2):
+                response = server.get(files.js_url)
+                assert response.content == files.js_content
+            response = server.get(files.js_url, headers={"Range": "bytes=21-30"})
+            assert response.content == files.js_content[21:31]
+        if application.fd_cache is not None:
+            assert len(application.fd_cache.entries) == 1
+    finally:
+        if application.fd_cache is not None:
+            application.fd_cache.clear()
+
+
+def sendfile_like_gunicorn(filelike, count):
+    """
+    Send `filelike` over a socket as gunicorn does, returning the bytes
+    received
+    """
+    fileno = filelike.fileno()
+    offset = os.lseek(fileno, 0, os.SEEK_CUR)
+    sender, receiver = socket.socketpair()
+    with sender, receiver, ThreadPoolExecutor(max_workers=1) as executor:
+        received = executor.submit(receive_all, receiver, count)
+        sender.sendfile(filelike, offset=offset, count=count)
+        os.lseek(fileno, offset, os.SEEK_SET)
+        return received.result(timeout=5)
+
+
+def receive_all(sock, count):
+    chunks = []
+    while count > 0:
+        chunk = sock.recv(count)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        count -= len(chunk)
+    return b"".join(chunks)
+
+
+@pytest.mark.skipif(not hasattr(os, "sendfile"), reason="Needs os.sendfile")
+@pytest.mark.parametrize("fd_cache_size", [None, 4])
+def test_open_ended_range_responses_support_sendfile(fd_cache_size):
+    with open(__file__, "rb") as f:
+        content = f.read()
+    application = WhiteNoise(
+        None, root=os.path.dirname(__file__), fd_cache_size=fd_cache_size
+    )
+    static_file = application.files["/" + os.path.basename(__file__)]
+    try:
+        # Descriptors shared between responses can only be sent from the start
+        for start in (0,) if fd_cache_size else (0, 100):
+            response = static_file.get_response(
+                "GET", {"HTTP_RANGE": f"bytes={start}-"}
+            )
+            assert response.status == HTTPStatus.PARTIAL_CONTENT
+            with response.file as f:
+                length = len(content) - start
+                assert sendfile_like_gunicorn(f, length) == content[start:]
+                assert f.read() == b""
+    finally:
+        if application.fd_cache is not None:
+            application.fd_cache.clear()
+
+
+def test_zstd_variants_negotiated():
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "app.js")
+        for suffix, content in (("", b"x" * 100), (".gz", b"g" * 20), (".zst", b"z")):
+            with open(path + suffix, "wb") as f:
+                f.write(content)
+        application = WhiteNoise(None, root=tmp)
+        assert "/app.js.zst" not in application.files
+        static_file = application.files["/app.js"]
+        response = static_file.get_response(
+            "HEAD", {"HTTP_ACCEPT_ENCODING": "gzip, zstd"}
+        )
+        assert ("Content-Encoding", "zstd") in response.headers
+        response = static_file.get_response(
+            "HEAD", {"HTTP_ACCEPT_ENCODING": "gzip, zstd;q=0.5"}
+        )
+        assert ("Content-Encoding", "gzip") in response.headers
+    finally:
+        shutil.rmtree(tmp)
+
+
+@pytest.mark.parametrize("scan_workers", [None, 4])
+def test_startup_report(files, scan_workers):
+    reports = []
+    application = _init_application(
+        files.directory, startup_report=reports.append, scan_workers=scan_workers
+    )
+    [report] = reports
+    assert report["source"] == os.path.join(files.directory, "")
+    assert report["prefix"] == "/"
+    redirects = [
+        value for value in application.files.values() if isinstance(value, Redirect)
+    ]
+    assert report["redirects"] == len(redirects) == 2
+    assert report["files"] == len(application.files) - len(redirects)
+    assert report["alternatives"] >= 1
+    assert report["lazy_files"] == 0
+    assert {"scan", "media_types", "add_headers_function", "static_files"} <= set(
+        report["phases"]
+    )
+    assert all(seconds >= 0 for seconds in report["phases"].values())
+    # The instrumented methods are restored afterwards
+    assert "create_static_file" not in application.__dict__
+    assert application.add_headers_function.__name__ == "custom_headers"
+
+
+def test_startup_report_logged(files, caplog):
+    with caplog.at_level(logging.INFO, logger="whitenoise"):
+        _init_application(files.directory, startup_report=True)
+    [record] = caplog.records
+    assert record.getMessage().startswith("Added ")
+    assert files.directory in record.getMessage()
+
+
+def test_files_index_memory_footprint():
+    # A large site, with compressed variants of half its files
+    file_count = 2000
+    tmp = tempfile.mkdtemp()
+    try:
+        for i in range(file_count):
+            directory = os.path.join(tmp, f"dir{i % 20}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"file{i}.css")
+            with open(path, "wb") as f:
+                f.write(b"body {}" * 50)
+            if i % 2:
+                with open(path + ".gz", "wb") as f:
+                    f.write(b"compressed")
+        # Build the index once first, so that imports, module level caches
+        # and shared header values aren't counted, whichever tests have run
+        WhiteNoise(None, root=tmp, max_age=60)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            application = WhiteNoise(None, root=tmp, max_age=60)
+            size, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        shutil.rmtree(tmp)
+    assert len(application.files) == file_count
+    # Header values common to many files are only stored once
+    first, second = (
+        application.files[f"/dir{i}/file{i}.css"].alternatives[-1][2] for i in (0, 2)
+    )
+    for first_header, second_header in zip(first.headers, second.headers):
+        if first_header[0] in ("Content-Type", "Cache-Control", "Vary"):
+            assert first_header is second_header
+    # Including the URLs, paths and dictionary itself. This was over 2KB per
+    # file before the index was made more compact.
+    assert size / file_count < 1800
+
+
+def test_shared_header_values_dont_grow_with_reloads():
+    tmp = tempfile.mkdtemp()
+    try:
+        for i in range(10):
+            with open(os.path.join(tmp, f"file{i}.css"), "wb") as f:
+                f.write(b"body {}")
+        application = WhiteNoise(None, root=tmp, max_age=60)
+        shared_count = len(responders._shared_values)
+        for reload in range(5):
+            # Give every file a new, distinct modification time
+            for i in range(10):
+                mtime = 10**9 + reload * 100 + i
+                os.utime(os.path.join(tmp, f"file{i}.css"), (mtime, mtime))
+            application.reload()
+    finally:
+        shutil.rmtree(tmp)
+    assert len(responders._shared_values) == shared_count
@@ -62,3 +62,30 @@ class Files:
             setattr(self, name + "_path", path)
             setattr(self, name + "_url", url)
             setattr(self, name + "_content", content)
+
+
+def write_file(directory, name, content):
+    """
+    Replace the file `name` below `directory` atomically, as a deployment
+    should, and make sure its directory's mtime changes
+    """
+    path = os.path.join(directory, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(content)
+    os.replace(path + ".tmp", path)
+    mark_changed(os.path.dirname(path))
+    return path
+
+
+def mark_changed(directory):
+    # Move the mtime forwards explicitly, as filesystems may have coarse
+    # timestamps
+    mtime = os.stat(directory).st_mtime_ns
+    os.utime(directory, ns=(mtime + 10**9, mtime + 10**9))
+
+
+def get_content(static_file):
+    response = static_file.get_response("GET", {})
+    with response.file as f:
+        return f.read()